@@ -1,4 +1,7 @@
+import queue
+import threading
 from tkinter import *
+
 import scrape
 
 # Create Tkinter window
@@ -6,14 +9,88 @@ window = Tk()
 window.title("NBA Player Stats Prediction")
 window.geometry("365x350+10+20")
 
+lookups = queue.Queue()     # Players waiting to be looked up, each with the number of the search it belongs to
+updates = queue.Queue()     # Progress and finished messages from the worker, shown by the Tk thread
+latest = 0      # Number of the most recent search, lookups for any older search are abandoned
+status = StringVar()
 
-def show_message(player):
+
+class LookupCancelled(Exception):
+    """
+    Raised inside the worker to abandon a lookup that has been cancelled or superseded by a newer search.
+    """
+
+
+def worker():
+    """
+    Look up players from the lookups queue one at a time, away from the Tk thread, and send progress and finished messages to the
+    updates queue. A lookup stops at its next step as soon as a newer search is made or the search is cancelled.
+    """
+    while True:
+        search, player = lookups.get()
+        if search != latest:        # Superseded while waiting in the queue
+            continue
+
+        def progress(message):
+            if search != latest:
+                raise LookupCancelled
+            updates.put((search, "progress", message))
+
+        try:
+            message = scrape.make_message(player, progress)
+        except LookupCancelled:
+            continue
+        except Exception as e:      # Network errors and the like
+            message = f"Could not get a prediction for {player}: {e}"
+        updates.put((search, "done", message))
+
+
+def show_updates():
     """
-    Create and display a message with stats of an NBA player or with an error message if stats cannot be created.
+    Show any progress or finished messages from the worker for the most recent search, then check again shortly.
+    """
+    while True:
+        try:
+            search, kind, message = updates.get_nowait()
+        except queue.Empty:
+            break
+        if search != latest:        # Left over from a search that was superseded
+            continue
+        if kind == "progress":
+            status.set(message)
+        else:
+            display(message)
+            status.set("")
+    window.after(100, show_updates)
+
+
+def display(text):
+    """
+    Display a message in the area above the entry box.
     """
     # Add a white label over the area where the message will be displayed to prevent previous messages from interfering
     Label(window, width=355, height=14).place(x=1, y=40)
-    Message(window, text=scrape.make_message(player), width=355, justify=CENTER).place(x=1, y=40)
+    Message(window, text=text, width=355, justify=CENTER).place(x=1, y=40)
+
+
+def show_message(player):
+    """
+    Create and display a message with stats of an NBA player or with an error message if stats cannot be created. The lookup runs on the
+    worker thread so the window stays responsive, and replaces any lookup still in progress.
+    """
+    global latest
+    latest += 1
+    status.set(f"Looking up {player}...")
+    lookups.put((latest, player))
+
+
+def cancel():
+    """
+    Abandon the lookup in progress, if any.
+    """
+    global latest
+    latest += 1
+    status.set("Cancelled")
 
 
 def main():
@@ -22,12 +99,16 @@ def main():
     """
     playerInput = StringVar()
     Message(window, text="Enter the name of a current NBA player to get a prediction for their stats in their next game.", width=355, justify=CENTER).place(x=1, y=1)
+    Label(window, textvariable=status).place(x=5, y=255)
     Label(window, text="NBA Player (Full Name): ").place(x=5, y=280)
     Entry(window, textvariable=playerInput).place(x=160, y=280)
     # When the button is clicked, create a message for whatever is currently in the entry box
-    Button(window, text="Search", width=7, height=2, command=lambda:show_message(playerInput.get())).place(x=145, y=310)
+    Button(window, text="Search", width=7, height=2, command=lambda:show_message(playerInput.get())).place(x=105, y=310)
+    Button(window, text="Cancel", width=7, height=2, command=cancel).place(x=185, y=310)
+    threading.Thread(target=worker, daemon=True).start()
+    window.after(100, show_updates)
     window.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
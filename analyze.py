@@ -1,25 +1,55 @@
 import numpy as np
-from sklearn.linear_model import LinearRegression
+
+from gamelog import STAT_KEYS, KEY_INDEX, as_gamelog
+
+# Variables used to create a model for each dependent variable (key)
+MODEL_VARIABLES = {
+    "rb": ["mins", "oppPace"],
+    "ast": ["mins", "oppPace", "oppDef"],
+    "stl": ["mins", "oppPace", "oppOff"],
+    "blk": ["mins", "oppPace", "oppOff"],
+    "tov": ["mins", "oppPace", "oppDef"],
+    "fta": ["mins", "oppPace", "oppDef"],
+    "3pa": ["mins", "oppPace", "oppDef"],
+    "fga": ["mins", "oppPace", "oppDef"],
+    "fgm": ["fga", "oppPace", "oppDef"],
+    "3pm": ["3pa", "oppPace", "oppDef"],
+    "ftm": ["fta", "oppPace"]
+}
+MAX_VARIABLES = 3
+
+# Positions of each model's dependent and independent variables in a row of moments (position 0 is the constant 1), with models that
+# have fewer variables padded by the constant, and a mask marking which variables are real
+DEPENDENT_INDEX = np.array([STAT_KEYS.index(key) + 1 for key in MODEL_VARIABLES])
+VARIABLE_INDEX = np.array([[STAT_KEYS.index(var) + 1 for var in variables] + [0] * (MAX_VARIABLES - len(variables))
+                           for variables in MODEL_VARIABLES.values()])
+VARIABLE_MASK = VARIABLE_INDEX > 0
+
+# Stats predicted from the opponent ratings and minutes alone, then the stats that also need those predictions
+PREDICTION_STAGES = [
+    ["rb", "ast", "stl", "blk", "tov", "fta", "3pa", "fga"],
+    ["fgm", "3pm", "ftm"]
+]
+
+# Singular values of the centered cross products below this fraction of the largest are treated as zero, so perfectly collinear
+# variables (e.g. fewer games than variables) get the same minimum norm solution as a least squares solver rather than rounding noise
+RCOND = 1e-10
+
 
 def make_datapoints(dictionaryList, dependent, independent1, independent2, independent3):
     """
-    Given a list of dictionaries full of stats, a dependent variable and 2 or 3 independent variables (all keys in each
-    dictionary in the list), return a list of independent vars from each dictionary and another of dependent vars from each dictionary.
+    Given a GameLog or a list of dictionaries full of stats, a dependent variable and 2 or 3 independent variables (all keys in each
+    dictionary in the list), return a list of independent vars from each game played and another of dependent vars from each game played.
 
-    dictionaryList -- List of dictionaries
+    dictionaryList -- GameLog or list of dictionaries (None for games not played)
     dependent -- String and key in each dictionary
     independent1, 2 & 3 -- Strings and keys in each dictionary
     """
-    x = []
-    y = []
-    for dictionary in dictionaryList:
-        if dictionary:      # If player has stats for that game
-            if independent3:        # If 3 independent vars
-                x.append([dictionary[independent1], dictionary[independent2], dictionary[independent3]])
-                y.append(dictionary[dependent])
-            else:
-                x.append([dictionary[independent1], dictionary[independent2]])
-                y.append(dictionary[dependent])
+    log = as_gamelog(dictionaryList)
+    independents = [independent1, independent2, independent3] if independent3 else [independent1, independent2]
+    played = log.data[log.played]       # Only games the player has stats for
+    x = played[:, [KEY_INDEX[key] for key in independents]].tolist()
+    y = played[:, KEY_INDEX[dependent]].tolist()
 
     return (x, y)
 
@@ -27,8 +57,10 @@ def make_datapoints(dictionaryList, dependent, independent1, independent2, indep
 def linear_regression(x, y):
     """
     Given two sets of data points where the x set is multi-dimensional, create a multiple linear regression model and
-    return the coefficients as well as the intercept for the model.
+    return the coefficients as well as the intercept for the model. Predictions use fit_models instead, so sklearn is only imported here.
     """
+    from sklearn.linear_model import LinearRegression
+
     x, y = np.array(x), np.array(y)     # Convert to np array for sklearn module
     model = LinearRegression().fit(x, y)
     coefs = list(model.coef_)
@@ -36,53 +68,126 @@ def linear_regression(x, y):
     return [coefs, intercept]
 
 
+def stats_matrix(dictionaryList):
+    """
+    Given a GameLog or a list of dictionaries full of stats (None for games not played), return an array with a row of stats for each
+    game in the order of STAT_KEYS and an array of weights that is 1 for games played and 0 for games missed.
+    """
+    log = as_gamelog(dictionaryList)
+    return log.data, log.weights()
+
+
+def moment_matrix(data, weights):
+    """
+    Given an array of games by stats (optionally stacked for several players) and the weight of each game, return the weighted sums of
+    products of every pair of stats, with a constant 1 added as the first stat. These sums are all that is needed to fit every model,
+    and can be added to or subtracted from as games come and go.
+    """
+    rows = np.concatenate([np.ones(data.shape[:-1] + (1,)), data], axis=-1)
+    return np.einsum('...g,...gi,...gj->...ij', weights, rows, rows)
+
+
+def solve_models(moments):
+    """
+    Given moment matrices from moment_matrix (optionally stacked for several players), fit every model in MODEL_VARIABLES with one
+    batched least squares solve. Return an array of coefficients (padded with zeros to MAX_VARIABLES) and an array of intercepts, with
+    one row per model in the order of MODEL_VARIABLES.
+    """
+    count = moments[..., 0, 0]      # Weighted number of games, one per player
+    sums = moments[..., 0, :]
+
+    # Cross products of each model's variables with themselves and with the dependent variable, centered on their means
+    xx = moments[..., VARIABLE_INDEX[:, :, None], VARIABLE_INDEX[:, None, :]]
+    xy = moments[..., VARIABLE_INDEX, DEPENDENT_INDEX[:, None]]
+    xSums = sums[..., VARIABLE_INDEX]
+    ySums = sums[..., DEPENDENT_INDEX]
+    safeCount = np.where(count > 0, count, 1.0)[..., None]
+    xx = xx - xSums[..., :, None] * xSums[..., None, :] / safeCount[..., None, None]
+    xy = xy - xSums * (ySums / safeCount)[..., None]
+
+    # Remove padding so it gets a coefficient of 0
+    xx = xx * (VARIABLE_MASK[:, :, None] & VARIABLE_MASK[:, None, :])
+    xy = xy * VARIABLE_MASK
+
+    coefs = np.einsum('...ij,...j->...i', np.linalg.pinv(xx, rcond=RCOND, hermitian=True), xy)
+    intercepts = (ySums - np.einsum('...i,...i->...', coefs, xSums)) / safeCount
+    return coefs, intercepts
+
+
+def models_dictionary(coefs, intercepts):
+    """
+    Given the coefficients and intercepts for one player from solve_models, return a dictionary mapping each stat to a list of its
+    coefficients and its intercept, in the same form as linear_regression.
+    """
+    models = {}
+    for i, key in enumerate(MODEL_VARIABLES):
+        models[key] = [list(coefs[i][:len(MODEL_VARIABLES[key])]), intercepts[i]]
+    return models
+
+
+def fit_models(dictionaryList, history=None):
+    """
+    Given a GameLog or a list of dictionaries full of stats from one player's games (None for games not played), return a dictionary of
+    models for every stat in MODEL_VARIABLES, in the same form as linear_regression. history, if given, is a moment matrix of earlier
+    games (e.g. weighted past seasons) that the models are fit on as well.
+    """
+    moments = moment_matrix(*stats_matrix(dictionaryList))
+    if history is not None:
+        moments = moments + history
+    coefs, intercepts = solve_models(moments)
+    return models_dictionary(coefs, intercepts)
+
+
+def fit_models_batch(playersDictionaries, histories=None):
+    """
+    Given a list with a GameLog or list of game dictionaries for each player, return a list with a dictionary of models for each player. Every
+    player's games are stacked into one array, padded with weightless games, so all models for all players are fit in one solve.
+    histories, if given, has a moment matrix of earlier games (or None) for each player, as in fit_models.
+    """
+    if not playersDictionaries:
+        return []
+    longest = max(len(dictionaryList) for dictionaryList in playersDictionaries)
+    data = np.zeros((len(playersDictionaries), longest, len(STAT_KEYS)))
+    weights = np.zeros((len(playersDictionaries), longest))
+    for i, dictionaryList in enumerate(playersDictionaries):
+        data[i, :len(dictionaryList)], weights[i, :len(dictionaryList)] = stats_matrix(dictionaryList)
+
+    moments = moment_matrix(data, weights)
+    for i, history in enumerate(histories or []):
+        if history is not None:
+            moments[i] += history
+    coefs, intercepts = solve_models(moments)
+    return [models_dictionary(coefs[i], intercepts[i]) for i in range(len(playersDictionaries))]
+
+
 def minutes_estimation(stats):
     """
-    Given a list of dictionaries where each dictionary contains stats from one game for one player, determine how many
-    games a player missed based on how many dictionaries are replaced with None. Create a prediction on how many minutes
-    the player will play in their next game based on their recent minutes played. Return prediction and boolean dic for tracking games missed.
+    Given a GameLog or a list of dictionaries where each dictionary contains stats from one game for one player (None for games missed),
+    determine how many games a player missed. Create a prediction on how many minutes the player will play in their next game based on
+    their recent minutes played. Return prediction and boolean dic for tracking games missed.
     """
+    log = as_gamelog(stats)
+    missed = np.cumsum(~log.played)       # Number of games missed up to and including each game
+    games = len(log)
+
     limitations = {
-        "lastGame": False,
-        "last5": False,
-        "15": False,
-        "10last15": False
+        "lastGame": games > 1 and bool(missed[0] == 1),        # If player missed last game
+        "last5": games > 5 and bool(missed[4] == 5),       # If player missed last five games
+        "15": games > 1 and bool(missed[games - 2] >= 15),      # If the player missed 15 games (not counting the oldest)
+        "10last15": games > 15 and bool(missed[14] >= 10)      # If player missed 10 of last 15 games
     }
 
-    gamesMissed = 0
-    for i in range(len(stats)):
-        if gamesMissed == 1 and i == 1:     # If player missed last game
-            limitations["lastGame"] = True
-        if gamesMissed == 5 and i == 5:       # If player missed last five games
-            limitations["last5"] = True
-        if gamesMissed >= 10 and i == 15:        # If player missed 10 of last 15 games
-            limitations["10last15"] = True
-        if gamesMissed == 15:       # If the player missed 15 games
-            limitations["15"] = True
-        if not stats[i]:
-            gamesMissed += 1
-    if gamesMissed == len(stats):       # If player missed all games
+    if games == 0 or missed[-1] == games:       # If player missed all games
         return limitations, None
     
-    predictedMinutes = 0.0
+    minutes = log.column("mins")
     if limitations["last5"] or limitations["10last15"]:     # If player missed a lot of recent games, use all data to estimate minutes
-        for game in stats:
-            if game:
-                predictedMinutes += game["mins"]
-        predictedMinutes /= len(stats) - gamesMissed
-
+        predictedMinutes = minutes[log.played].mean()
     else:                                         # If player did not miss a lof of recent games, use more recent samples and less data
-        counter = 0                               # Idea being more recent games give more accurate estimate of mins played
-        missed = 0
-        for i in range(len(stats)) if len(stats) < 15 else range(15):
-            if stats[i]:
-                predictedMinutes += stats[i]["mins"]
-            else:
-                missed += 1
-            counter += 1
-        predictedMinutes /= counter - missed
+        recent = log.played[:15]                  # Idea being more recent games give more accurate estimate of mins played
+        predictedMinutes = minutes[:15][recent].mean()
 
-    return limitations, round(predictedMinutes)
+    return limitations, round(float(predictedMinutes))
 
 
 def prediction(minutes, models, ratings):
@@ -90,38 +195,51 @@ def prediction(minutes, models, ratings):
     Given a player's predicted minutes played, a dictionary of statistical models for each key (corresponding to a stat) and the 
     next opposing team's ratings, return a dictionary of predictions for what stats a player will have in their next game.
     """
-    predictedStats = {}
-    # Each key corresponds to a list of values that multiply with corresponding coefficients in the models dict to achieve predictions
-    plugIns = {
-        "rb": [minutes, ratings[2]],
-        "ast": [minutes, ratings[2], ratings[1]],
-        "stl": [minutes, ratings[2], ratings[0]],
-        "blk": [minutes, ratings[2], ratings[0]],
-        "tov": [minutes, ratings[2], ratings[1]],
-        "fta": [minutes, ratings[2], ratings[1]],
-        "3pa": [minutes, ratings[2], ratings[1]],
-        "fga": [minutes, ratings[2], ratings[1]],
+    # Values that multiply with the coefficients in the models dict, filled in with each stage's predictions for the next stage
+    values = {
+        "mins": minutes,
+        "oppOff": ratings[0],
+        "oppDef": ratings[1],
+        "oppPace": ratings[2]
     }
+    predictedStats = {}
 
-    for key in plugIns:
-        predictedStats[key] = models[key][1]        # Set initial value of prediction equal to value of intercept for current stat
-        for i in range(len(models[key][0])):        # For each coefficient
-            predictedStats[key] += models[key][0][i] * plugIns[key][i]      # Add coefficient multiplied by corresponding value (minutes or some rating)
-        predictedStats[key] = round(predictedStats[key])
-
-    # Plugins that could not be defined in the first dict because they rely on results from the first for loop
-    dependentPlugIns = {
-        "fgm": [predictedStats["fga"], ratings[2], ratings[1]],
-        "3pm": [predictedStats["3pa"], ratings[2], ratings[1]],
-        "ftm": [predictedStats["fta"], ratings[2]]
-    }
-    for key in dependentPlugIns:
-        predictedStats[key] = models[key][1]        # Same process as above
-        for i in range(len(models[key][0])):
-            predictedStats[key] += models[key][0][i] * dependentPlugIns[key][i]
-        predictedStats[key] = round(predictedStats[key])
+    for keys in PREDICTION_STAGES:
+        coefs = np.zeros((len(keys), MAX_VARIABLES))
+        plugIns = np.zeros((len(keys), MAX_VARIABLES))
+        for i, key in enumerate(keys):
+            variables = MODEL_VARIABLES[key]
+            coefs[i, :len(variables)] = models[key][0]
+            plugIns[i, :len(variables)] = [values[var] for var in variables]
+        intercepts = np.array([models[key][1] for key in keys])
+
+        # Intercept plus each coefficient multiplied by its corresponding value (minutes, some rating or an earlier prediction)
+        predictions = np.rint(intercepts + np.einsum('ij,ij->i', coefs, plugIns))
+        for key, predicted in zip(keys, predictions):
+            predictedStats[key] = int(predicted)
+            values[key] = predictedStats[key]
     
     predictedStats["mins"] = minutes
     predictedStats["rtgs"] = ratings
     
-    return predictedStats
\ No newline at end of file
+    return predictedStats
+
+
+def prediction_batch(minutes, ratings, coefs, intercepts):
+    """
+    Given arrays of predicted minutes and next opponent ratings (offensive, defensive, pace) for any number of predictions, and the
+    coefficients and intercepts from solve_models for each, return an array with a row of predicted stats for each prediction in the
+    order of MODEL_VARIABLES. Stats are predicted in PREDICTION_STAGES and rounded exactly as prediction does.
+    """
+    # Values plugged into the models, laid out like a row of moments (position 0 is the constant 1) so VARIABLE_INDEX picks them out
+    values = np.zeros((len(minutes), len(STAT_KEYS) + 1))
+    values[:, 0] = 1
+    values[:, KEY_INDEX["mins"] + 1] = minutes
+    values[:, [KEY_INDEX["oppOff"] + 1, KEY_INDEX["oppDef"] + 1, KEY_INDEX["oppPace"] + 1]] = ratings
+
+    models = list(MODEL_VARIABLES)
+    for keys in PREDICTION_STAGES:
+        stage = [models.index(key) for key in keys]
+        plugIns = values[:, VARIABLE_INDEX[stage]]
+        values[:, DEPENDENT_INDEX[stage]] = np.rint(intercepts[:, stage] + np.einsum('nij,nij->ni', coefs[:, stage], plugIns))
+    return values[:, DEPENDENT_INDEX]
@@ -0,0 +1,189 @@
+"""
+Walk-forward backtest of the prediction pipeline: every game of a season is predicted from the games before it, exactly as
+scrape.make_prediction would have predicted it that day, and the predictions are compared with what the player actually did.
+
+    python backtest.py [--season YEAR] [--window N] [--min-games N] [--site URL] [--replay DIR] [--json] PLAYER [PLAYER ...]
+    python backtest.py --league [...]
+
+Each PLAYER is a name or a three letter team abbreviation standing for the whole roster, and --league backtests every roster. Opponent
+ratings come from the gamelog rows, which hold each opponent's ratings as they were when the page was scraped rather than on the day of
+the game, so errors for past seasons are slightly optimistic.
+"""
+import argparse
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+import fetch
+from analyze import MODEL_VARIABLES, solve_models, minutes_estimation, prediction_batch
+from batch import expand_players
+from gamelog import KEY_INDEX
+from players import find_player
+from scrape import YEAR, TEAMS, GAMELOG_WINDOW, sync_games
+
+STATS = list(MODEL_VARIABLES) + ["pts"]     # Stats scored, in the order of the columns of predicted and actual stats
+RATING_COLUMNS = [KEY_INDEX["oppOff"], KEY_INDEX["oppDef"], KEY_INDEX["oppPace"]]
+ACTUAL_COLUMNS = [KEY_INDEX[key] for key in MODEL_VARIABLES]
+
+
+def walk_forward(log, window=GAMELOG_WINDOW, minGames=1):
+    """
+    Given a GameLog of a player's season (most recent game first), return what is needed to predict every game they played from the
+    window games before it: a stack of moment matrices, the predicted minutes, the opponent ratings and the actual stats, with one row
+    for each game predicted. Games are skipped when fewer than minGames of the games before them were played.
+
+    Rather than refitting at every game, the moment matrix of the window is carried forward through the season, adding the game that
+    joins the window and subtracting the one that leaves it.
+    """
+    games = len(log)
+    season = log[::-1]      # Oldest game first
+    rows = np.concatenate([np.ones((games, 1)), season.data], axis=1)
+    gameMoments = season.weights()[:, None, None] * rows[:, :, None] * rows[:, None, :]     # Each game's share of the moment matrix
+
+    moments = np.zeros(gameMoments.shape[1:])
+    stacked, minutes, ratings, actual = [], [], [], []
+    for t in range(games):
+        if t > 0:
+            moments += gameMoments[t - 1]
+            if t - 1 - window >= 0:
+                moments -= gameMoments[t - 1 - window]
+        if not season.played[t]:        # Nothing to compare a prediction with
+            continue
+
+        history = log[games - t:games - t + window]     # The window of games before this one, most recent first
+        if history.played.sum() < minGames:
+            continue
+        predictedMinutes = minutes_estimation(history)[1]
+        if predictedMinutes is None:
+            continue
+        stacked.append(moments.copy())
+        minutes.append(predictedMinutes)
+        ratings.append(season.data[t, RATING_COLUMNS])
+        actual.append(season.data[t, ACTUAL_COLUMNS])
+
+    if not stacked:
+        return np.zeros((0,) + moments.shape), np.zeros(0), np.zeros((0, 3)), np.zeros((0, len(MODEL_VARIABLES)))
+    return np.array(stacked), np.array(minutes), np.array(ratings), np.array(actual)
+
+
+def points(stats):
+    """
+    Given an array of stats in the order of MODEL_VARIABLES, return the points scored in each row, counted as format_stats does.
+    """
+    models = list(MODEL_VARIABLES)
+    fgm, threes, ftm = (stats[:, models.index(key)] for key in ["fgm", "3pm", "ftm"])
+    return (fgm - threes) * 2 + threes * 3 + ftm
+
+
+def backtest_logs(logs, window=GAMELOG_WINDOW, minGames=1):
+    """
+    Given a list of GameLogs, one for each player's season (most recent game first), return arrays of the predicted and actual stats for
+    every game predicted, with a column for each stat in STATS. The models for every game of a player's season are fit in one batched
+    solve, so memory only grows with the length of a season.
+    """
+    predicted, actual = [np.zeros((0, len(MODEL_VARIABLES)))], [np.zeros((0, len(MODEL_VARIABLES)))]
+    for log in logs:
+        moments, minutes, ratings, stats = walk_forward(log, window, minGames)
+        if len(minutes):
+            coefs, intercepts = solve_models(moments)
+            predicted.append(prediction_batch(minutes, ratings, coefs, intercepts))
+            actual.append(stats)
+
+    predicted, actual = np.concatenate(predicted), np.concatenate(actual)
+    return np.column_stack([predicted, points(predicted)]), np.column_stack([actual, points(actual)])
+
+
+def error_report(predicted, actual):
+    """
+    Given arrays of predicted and actual stats from backtest_logs, return a dictionary with the number of games predicted and the mean
+    absolute error, root mean squared error and mean bias (predicted minus actual) of each stat.
+    """
+    errors = predicted - actual
+    report = {"games": len(errors), "stats": {}}
+    for i, stat in enumerate(STATS if len(errors) else []):
+        report["stats"][stat] = {
+            "mae": float(np.abs(errors[:, i]).mean()),
+            "rmse": float(np.sqrt((errors[:, i] ** 2).mean())),
+            "bias": float(errors[:, i].mean())
+        }
+    return report
+
+
+def load_season(entry, season):
+    """
+    Given a (name, gamelog link w/out domain) pair from batch.expand_players, return a GameLog of every game of the player's season, or None
+    if the player or their gamelog cannot be found. One missing page does not stop a league backtest.
+    """
+    name, link = entry
+    link = link.split("/gamelog/")[0] if link else find_player(name)
+    if link is None:
+        return None
+    try:
+        return sync_games(link, window=None, season=season)[0]
+    except fetch.FetchError:
+        return None
+
+
+def season_logs(players, season=None):
+    """
+    Given a list of NBA player names and/or three letter team abbreviations, return a list of the names of the players found and a list
+    of a GameLog of the whole season for each of them. Player pages are fetched concurrently, on a pool of their own as in
+    batch.predict_players.
+    """
+    season = season or YEAR
+    with fetch.prioritized(fetch.BATCH):
+        entries = expand_players(players, season)
+        with ThreadPoolExecutor(max_workers=fetch.MAX_WORKERS) as playerPool:
+            logs = list(playerPool.map(fetch.in_context(partial(load_season, season=season)), entries))
+
+    names, found = [], []
+    for (name, link), log in zip(entries, logs):
+        if log is None:
+            print(f"Could not find a gamelog for {name}", file=sys.stderr)
+        else:
+            names.append(name)
+            found.append(log)
+    return names, found
+
+
+def format_report(report):
+    """
+    Given a dictionary from error_report with the number of players added under "players", return it as a table.
+    """
+    lines = [f"{report['games']} games predicted for {report['players']} players", f"{'stat':<6}{'MAE':>8}{'RMSE':>8}{'bias':>8}"]
+    for stat, errors in report["stats"].items():
+        lines.append(f"{stat:<6}{errors['mae']:>8.2f}{errors['rmse']:>8.2f}{errors['bias']:>8.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the predictions on every game of a season.")
+    parser.add_argument("players", nargs="*", metavar="PLAYER", help="player name or three letter team abbreviation")
+    parser.add_argument("--league", action="store_true", help="backtest every player on every roster")
+    parser.add_argument("--season", type=int, help="year the season ends in (default: the current one)")
+    parser.add_argument("--window", type=int, default=GAMELOG_WINDOW, help=f"games each prediction is made from (default {GAMELOG_WINDOW})")
+    parser.add_argument("--min-games", type=int, default=1, help="games played before a game is predicted (default 1)")
+    parser.add_argument("--site", help="base URL to scrape instead of basketball-reference, e.g. a local stand-in")
+    parser.add_argument("--replay", metavar="DIR", help="read pages recorded in DIR instead of fetching them")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON instead of a table")
+    args = parser.parse_args(argv)
+    if not args.players and not args.league:
+        parser.error("give at least one player or team, or --league")
+
+    if args.site:
+        fetch.SITE = args.site.rstrip("/")
+    if args.replay:
+        fetch.set_mode("replay", args.replay)
+
+    names, logs = season_logs(list(TEAMS) if args.league else args.players, args.season)
+    report = error_report(*backtest_logs(logs, args.window, args.min_games))
+    report["players"] = len(names)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import fetch
+from analyze import fit_models_batch
+from fetch import FetchError, get_page, fetch_all
+from players import find_player
+from scrape import YEAR, TEAMS, DECAY, current_season, player_link, team_roster, parse_games, attach_ratings, upcoming_opponent, \
+    get_opposing_ratings, past_seasons, organize_stats, build_prediction, format_stats, make_prediction
+
+
+def or_error(func):
+    """
+    Given a function that fetches pages, return a function that returns the FetchError instead of raising it, so a page that cannot be
+    fetched only fails the players who need it rather than the whole batch.
+    """
+    def call(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except FetchError as e:
+            return e
+    return call
+
+
+def expand_players(players, season=None):
+    """
+    Given a list of NBA player names and/or three letter team abbreviations, return a list of (name, gamelog link w/out domain) pairs
+    where every team is replaced by the players on its roster for the season. The link is None for players given by name, since it still
+    has to be found. A team whose roster cannot be fetched is left in the list as (abbrev, None).
+    """
+    entries = []
+    teams = [entry.upper() for entry in players if entry.upper() in TEAMS]
+    rosters = fetch_all(or_error(partial(team_roster, season=season)), teams)     # Rosters for every team requested, fetched concurrently
+    for entry in players:
+        if entry.upper() in TEAMS:
+            roster = rosters[entry.upper()]
+            entries += [(entry.upper(), None)] if isinstance(roster, FetchError) else roster
+        else:
+            entries.append((entry, None))
+    return list(dict.fromkeys(entries))     # A player listed twice, or on two requested rosters, only counts once
+
+
+def load_player(entry, season=None, date=None):
+    """
+    Given a (name, gamelog link w/out domain) pair, return the parsed games (before date, if given), opponent links and team for that
+    player in the season, or None if the player cannot be found. Return an error dictionary like scrape.make_prediction if a page cannot
+    be fetched, or for a team left in by expand_players because its roster could not be.
+    """
+    name, link = entry
+    if name in TEAMS and link is None:
+        return {"plyr": name, "error": f"Could not fetch the roster of the {TEAMS[name]}"}
+    try:
+        source = get_page(link) if link else player_link(name, season)
+    except FetchError as e:
+        return {"plyr": name, "error": f"Could not get a prediction for {name}: {e}"}
+    if source is None:
+        return None
+    return parse_games(source, before=date)
+
+
+def load_history(entry, season, seasons, decay=DECAY):
+    """
+    Given a (name, gamelog link w/out domain) pair, return the moment matrix of the player's games from the seasons - 1 seasons before
+    season, as scrape.past_seasons does, or None if the player is not in the index or has no such games.
+    """
+    name, link = entry
+    link = link.split("/gamelog/")[0] if link else find_player(name)
+    return past_seasons(link, season, seasons, decay) if link else None
+
+
+def predict_players(players, season=None, date=None, seasons=1, decay=DECAY):
+    """
+    Given a list of NBA player names and/or three letter team abbreviations from TEAMS (standing for every player on that team's roster),
+    return a list of prediction dictionaries like scrape.make_prediction, one for each player, with the formatted message under "message".
+    season, date, seasons and decay work as in scrape.make_prediction.
+
+    Every player page is fetched concurrently, then each team schedule and opponent page needed by any player is fetched only once for
+    the whole batch. The models for every player are fit together in one batched least squares solve. Pages are requested at batch
+    priority, so lookups a user is waiting for are sent first.
+    """
+    with fetch.prioritized(fetch.BATCH):
+        season = season or (current_season(date) if date else YEAR)
+        entries = expand_players(players, season)
+
+        # Player pages are independent of each other, so fetch them on a pool of their own. The shared fetch pool stays free for the
+        # opponent pages each player needs, and a player never waits on a thread that is waiting on them.
+        with ThreadPoolExecutor(max_workers=fetch.MAX_WORKERS) as playerPool:
+            loaded = dict(zip(entries, playerPool.map(fetch.in_context(partial(load_player, season=season, date=date)), entries)))
+
+        # Collect every schedule and opponent needed by the batch, then fetch each one once
+        found = [player for player in loaded.values() if isinstance(player, tuple) and player[0]]
+        upcoming = fetch_all(or_error(partial(upcoming_opponent, season=season, date=date)), [team for games, oppLinks, team in found])
+        ratings = fetch_all(or_error(get_opposing_ratings), [link for games, oppLinks, team in found for link in oppLinks if link])
+
+        jobs = []
+        results = {}
+        for entry in entries:
+            name = entry[0]
+            if loaded[entry] is None:
+                results[entry] = {"plyr": name, "error": "Please enter the name of a valid NBA player"}
+                continue
+            if isinstance(loaded[entry], dict):
+                results[entry] = loaded[entry]
+                continue
+            games, oppLinks, team = loaded[entry]
+            failed = [upcoming[team]] if games and isinstance(upcoming[team], FetchError) else []
+            failed += [ratings[link] for link in oppLinks if link and isinstance(ratings[link], FetchError)] if games else []
+            if failed:
+                results[entry] = {"plyr": name, "error": f"Could not get a prediction for {name}: {failed[0]}"}
+            elif games is None:
+                results[entry] = {"plyr": name, "error": "Please enter the name of a current NBA player"}
+            elif not games:
+                results[entry] = {"plyr": name, "error": f"Could not find any stats from previous games this year for {name}"}
+            else:
+                stats = attach_ratings(games, oppLinks)     # Every opponent is cached by now, so nothing is fetched here
+                jobs.append((entry, (name, team, stats) + upcoming[team]))
+
+        histories = None
+        if seasons > 1:
+            with ThreadPoolExecutor(max_workers=fetch.MAX_WORKERS) as playerPool:
+                histories = list(playerPool.map(fetch.in_context(partial(load_history, season=season, seasons=seasons, decay=decay)),
+                                                [entry for entry, args in jobs]))
+
+        models = fit_models_batch([organize_stats(args[2]) for entry, args in jobs], histories)
+        for (entry, args), playerModels in zip(jobs, models):
+            results[entry] = build_prediction(*args, models=playerModels)
+
+        for stats in results.values():
+            stats["message"] = stats["error"] if "error" in stats else format_stats(stats["warnings"], stats)
+        return [results[entry] for entry in entries]
+
+
+def predict(players, season=None, date=None, seasons=1, decay=DECAY):
+    """
+    Given a list of player names and/or team abbreviations, return a list of prediction dictionaries, each with the formatted message
+    under "message". A single player goes through make_prediction, everything else is run as one batch. season, date, seasons and decay
+    work as in scrape.make_prediction.
+    """
+    if len(players) == 1 and players[0].upper() not in TEAMS:
+        stats = make_prediction(players[0], season=season, date=date, seasons=seasons, decay=decay)
+        stats["message"] = stats["error"] if "error" in stats else format_stats(stats["warnings"], stats)
+        return [stats]
+    return predict_players(players, season, date, seasons, decay)
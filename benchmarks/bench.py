@@ -0,0 +1,231 @@
+"""
+Offline benchmarks for every stage of the prediction pipeline, run against a stand-in site built from the checked-in fixtures.
+
+    python benchmarks/bench.py [--repeat N] [--max-players N] [--json FILE]
+
+Each stage is timed on its own and reported as min/median/p95/max latency in milliseconds, with the peak memory allocated by one run.
+Gamelog stages run on 30, 82 and 246 game (three season) logs and batch stages on 1 to 500 players, so a regression in a hot path shows
+up as a change in one row. Cold starts of the command line entry point are run in new processes and checked against COLD_START_BUDGET.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+WORK = tempfile.mkdtemp(prefix="nba-bench-")
+os.environ["NBA_PLAYER_INDEX"] = os.path.join(WORK, "players.json")        # Never touch the caches of a real install
+os.environ["NBA_GAMELOG_STORE"] = os.path.join(WORK, "gamelogs.sqlite")
+os.environ["NBA_PREDICTION_CACHE"] = os.path.join(WORK, "predictions.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analyze
+import backtest
+import batch
+import fetch
+import league
+import players
+import scrape
+from standin import build_site, synthetic_players
+
+GAMELOG_SIZES = [30, 82, 246]
+BATCH_SIZES = [1, 10, 100, 500]
+LEAGUE_PLAYERS = 450        # Roughly every player on every roster, for a whole league backtest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Most milliseconds a new process may take for each cold start, from launch to exit. A lookup with nothing stored has to import the
+# pipeline, build the player index and parse every page, so it gets more time than just loading the pipeline.
+COLD_START_BUDGET = {
+    "cli --help": 300,
+    "import scrape": 800,
+    "cli one player (replay, nothing stored)": 1500,
+}
+
+
+def measure(func, repeat, setup=None):
+    """
+    Run func repeat times, calling setup (if given) before each run outside the timing, and return its latency distribution in
+    milliseconds along with the peak memory in KiB allocated during one more traced run.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return distribution(times, peak)
+
+
+def distribution(times, peak=0):
+    """
+    Given a list of latencies in milliseconds and peak memory in bytes, return the summary reported for a stage.
+    """
+    times = sorted(times)
+    return {
+        "min": times[0],
+        "median": statistics.median(times),
+        "p95": times[min(len(times) - 1, int(len(times) * 0.95))],
+        "max": times[-1],
+        "peakKiB": peak / 1024
+    }
+
+
+def clear_caches():
+    """
+    Forget every cached rating, schedule, stored game and prediction, so the next run does all of its parsing again.
+    """
+    scrape.PREDICTION_CACHE.clear()
+    scrape.RATINGS_CACHE.clear()
+    scrape.SCHEDULE_CACHE.clear()
+    league.RATINGS.clear()
+    league.SCHEDULES.clear()
+    scrape.GAME_STORE.clear()
+
+
+def clear_ratings():
+    """
+    Forget every cached team rating, including the league's table they are filled from, so the next lookup fetches them again.
+    """
+    scrape.RATINGS_CACHE.clear()
+    league.RATINGS.clear()
+
+
+def gamelog_stages(name, link, repeat):
+    """
+    Return the timings of every gamelog stage for one player.
+    """
+    source = fetch.get_page(link + "/gamelog/" + str(scrape.YEAR))
+    games, oppLinks, team = scrape.parse_games(source)
+    clear_caches()
+    log, team = scrape.get_games(source)
+    orgStats = scrape.organize_stats(log)
+    minutes = analyze.minutes_estimation(orgStats)[1]
+    models = scrape.make_regression_dictionary(orgStats)
+    oppLink = oppLinks[0] or "/teams/BOS/" + str(scrape.YEAR) + ".html"
+    ratings = scrape.get_opposing_ratings(oppLink)
+
+    return {
+        "player_link": measure(lambda: scrape.player_link(name), repeat),
+        "parse_games": measure(lambda: scrape.parse_games(source), repeat),
+        "parse_games (whole season)": measure(lambda: scrape.parse_games(source, None), repeat),
+        "get_games (cold ratings)": measure(lambda: scrape.get_games(source), repeat, clear_caches),
+        "organize_stats": measure(lambda: scrape.organize_stats(log), repeat),
+        "get_opposing_ratings (cold)": measure(lambda: scrape.get_opposing_ratings(oppLink), repeat, clear_ratings),
+        "get_opposing_ratings (league table)": measure(lambda: scrape.get_opposing_ratings(oppLink), repeat, scrape.RATINGS_CACHE.clear),
+        "get_opposing_ratings (cached)": measure(lambda: scrape.get_opposing_ratings(oppLink), repeat),
+        "minutes_estimation": measure(lambda: analyze.minutes_estimation(orgStats), repeat),
+        "make_regression_dictionary": measure(lambda: scrape.make_regression_dictionary(orgStats), repeat),
+        "prediction": measure(lambda: analyze.prediction(minutes, models, ratings), repeat),
+        "make_message (cold)": measure(lambda: scrape.make_message(name), repeat, clear_caches),
+        "make_message (games stored)": measure(lambda: scrape.make_message(name), repeat, scrape.PREDICTION_CACHE.clear),
+        "make_message (remembered)": measure(lambda: scrape.make_message(name), repeat),
+    }
+
+
+def batch_stages(sizes, repeat):
+    """
+    Return the timings of the batch stages for each number of players.
+    """
+    results = {}
+    for size in sizes:
+        names = [f"Bench Player{k:03d}" for k in range(size)]
+        logs = [scrape.get_games(fetch.get_page(players.find_player(name) + "/gamelog/" + str(scrape.YEAR)))[0] for name in names]
+        results[f"fit_models_batch ({size} players)"] = measure(lambda: analyze.fit_models_batch(logs), repeat)
+        results[f"predict_players ({size} players, cold)"] = measure(lambda: batch.predict_players(names), max(1, repeat // 10),
+                                                                     clear_caches)
+    return results
+
+
+def backtest_stages(repeat):
+    """
+    Return the timings of a season backtest for one player and for the whole league, all with 82 game seasons.
+    """
+    log = scrape.get_games(fetch.get_page("/players/l/logsi082/gamelog/" + str(scrape.YEAR)), window=None)[0]
+    return {
+        "backtest_logs (1 player)": measure(lambda: backtest.backtest_logs([log]), repeat),
+        f"backtest_logs ({LEAGUE_PLAYERS} players)": measure(lambda: backtest.backtest_logs([log] * LEAGUE_PLAYERS), max(1, repeat // 10)),
+    }
+
+
+def cold_starts(site, repeat):
+    """
+    Return the timings of each cold start in COLD_START_BUDGET, each run in a new process with empty caches reading pages from site.
+    """
+    commands = {
+        "cli --help": [os.path.join(ROOT, "cli.py"), "--help"],
+        "import scrape": ["-c", "import scrape"],
+        "cli one player (replay, nothing stored)": [os.path.join(ROOT, "cli.py"), "--replay", site, "LeBron James"],
+    }
+    results = {}
+    for stage, command in commands.items():
+        times = []
+        for run in range(repeat):
+            env = dict(os.environ, NBA_PLAYER_INDEX=os.path.join(WORK, f"cold{run}", "players.json"),
+                       NBA_GAMELOG_STORE=os.path.join(WORK, f"cold{run}", "gamelogs.sqlite"),
+                       NBA_PREDICTION_CACHE=os.path.join(WORK, f"cold{run}", "predictions.json"))
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        results[stage] = distribution(times)
+        results[stage]["budget"] = COLD_START_BUDGET[stage]
+    return results
+
+
+def print_results(title, results):
+    """
+    Print a table of stage timings.
+    """
+    print(f"\n{title}")
+    print(f"{'stage':<42}{'min':>9}{'median':>9}{'p95':>9}{'max':>9}{'peak KiB':>10}")
+    for stage, timing in results.items():
+        line = f"{stage:<42}{timing['min']:>9.2f}{timing['median']:>9.2f}{timing['p95']:>9.2f}{timing['max']:>9.2f}{timing['peakKiB']:>10.0f}"
+        if "budget" in timing:
+            line += f"  budget {timing['budget']}" + (" OVER" if timing["median"] > timing["budget"] else "")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the prediction pipeline offline.")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per stage (default 20)")
+    parser.add_argument("--max-players", type=int, default=max(BATCH_SIZES), help="largest batch to run (default 500)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    sizes = [size for size in BATCH_SIZES if size <= args.max_players]
+    sized = [(f"Sized Log{games}", f"/players/l/logsi{games:03d}", "BOS", games) for games in GAMELOG_SIZES]
+    build_site(os.path.join(WORK, "site"), scrape.YEAR, sized + synthetic_players(max(sizes), 30))
+    fetch.set_mode("replay", os.path.join(WORK, "site"))
+    players.player_index()      # Build the player index once, like a warm install
+
+    results = {}
+    for games in GAMELOG_SIZES:
+        results[f"{games} games"] = gamelog_stages(f"Sized Log{games}", f"/players/l/logsi{games:03d}", args.repeat)
+        print_results(f"{games} game log (ms)", results[f"{games} games"])
+    results["batch"] = batch_stages(sizes, args.repeat)
+    print_results("batches (ms)", results["batch"])
+    results["backtest"] = backtest_stages(args.repeat)
+    print_results("backtests of an 82 game season (ms)", results["backtest"])
+    results["cold start"] = cold_starts(os.path.join(WORK, "site"), max(1, args.repeat // 4))
+    print_results("cold starts (ms)", results["cold start"])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Checks the request scheduler in fetch against a local stub server: rate limiting, priorities, coalescing of identical requests, retries
+with backoff, Retry-After (and giving up on long ones) and revalidation of unchanged pages.
+
+    python benchmarks/check_fetch.py
+
+Each check prints PASS or FAIL with what was seen, and the script exits with 1 if any check failed.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+WORK = tempfile.mkdtemp(prefix="nba-check-")
+os.environ["NBA_PLAYER_INDEX"] = os.path.join(WORK, "players.json")        # Never touch the caches of a real install
+os.environ["NBA_GAMELOG_STORE"] = os.path.join(WORK, "gamelogs.sqlite")
+os.environ["NBA_PREDICTION_CACHE"] = os.path.join(WORK, "predictions.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fetch
+import scrape
+from standin import build_site
+from stub_server import make_server
+
+PAGES = [f"/teams/{team}/{scrape.YEAR}.html" for team in scrape.TEAMS]
+
+
+def serve(**options):
+    """
+    Start a stub server for the stand-in with the given options, point fetch at it and return it. Every cache in fetch starts empty.
+    """
+    server = make_server(os.path.join(WORK, "site"), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetch.SITE = f"http://127.0.0.1:{server.server_address[1]}"
+    fetch.PAGES.clear()
+    fetch.set_rate(None)
+    return server
+
+
+def fetch_together(links):
+    """
+    Request every link at the same time, each from its own thread with the caller's priority, and return the pages in the same order.
+    """
+    pages = [None] * len(links)
+
+    def get(i):
+        pages[i] = fetch.get_page(links[i])
+    threads = [threading.Thread(target=fetch.in_context(get), args=(i,)) for i in range(len(links))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return pages
+
+
+def check_coalescing():
+    server = serve(delay=0.3)
+    pages = fetch_together([PAGES[0]] * 8)
+    requests = len(server.counters.paths)
+    server.shutdown()
+    return requests == 1 and len(set(pages)) == 1, f"8 identical requests in flight reached the site {requests} time(s)"
+
+
+def check_revalidation():
+    server = serve()
+    first = fetch.get_page(PAGES[0])
+    second = fetch.get_page(PAGES[0])
+    statuses = dict(server.counters.statuses)
+    server.shutdown()
+    return first == second and statuses.get(304) == 1, f"second request answered with {statuses}"
+
+
+def check_rate_limit():
+    server = serve()
+    fetch.set_rate(120, burst=2)        # Two at once, then one every half second
+    start = time.monotonic()
+    fetch_together(PAGES[:6])
+    elapsed = time.monotonic() - start
+    server.shutdown()
+    return elapsed >= 1.9, f"6 requests at 120 a minute with a burst of 2 took {elapsed:.2f}s (at least 2s expected)"
+
+
+def check_priority():
+    server = serve()
+    fetch.set_rate(300, burst=1)        # One request every 0.2 seconds
+
+    def batch():
+        with fetch.prioritized(fetch.BATCH):
+            fetch_together(PAGES[1:7])
+    batchThread = threading.Thread(target=batch)
+    batchThread.start()
+    time.sleep(0.3)     # Let the batch start waiting for the limit
+    fetch.get_page(PAGES[0])
+    batchThread.join()
+    order = server.counters.paths
+    server.shutdown()
+    position = order.index(PAGES[0])
+    return position <= 2, f"interactive request sent {position + 1} of {len(order)}, ahead of {len(order) - position - 1} batch requests"
+
+
+def check_retries():
+    server = serve(failEvery=2)
+    fetch.BACKOFF = 0.05
+    pages = [fetch.get_page(link) for link in PAGES[:4]]
+    statuses = dict(server.counters.statuses)
+    server.shutdown()
+    return all(pages) and statuses.get(200) == 4 and statuses.get(503, 0) > 0, f"4 pages fetched through {statuses}"
+
+
+def check_retry_after():
+    server = serve(limit=3, window=2)
+    start = time.monotonic()
+    pages = [fetch.get_page(link) for link in PAGES[:5]]
+    elapsed = time.monotonic() - start
+    statuses = dict(server.counters.statuses)
+    server.shutdown()
+    return all(pages) and statuses.get(200) == 5 and statuses.get(429, 0) > 0, \
+        f"5 pages past a limit of 3 every 2s fetched through {statuses} in {elapsed:.2f}s"
+
+
+def check_long_wait():
+    server = serve(limit=1, window=3600)        # Every request after the first is asked to wait up to an hour
+    fetch.set_rate(6000)        # A limit to pause, far above what the check uses
+    fetch.get_page(PAGES[0])
+    start = time.monotonic()
+    try:
+        fetch.get_page(PAGES[1])
+        failed = False
+    except fetch.FetchError:
+        failed = True
+    elapsed = time.monotonic() - start
+    paused = fetch.limiter.updated - time.monotonic()
+    server.shutdown()
+    return failed and elapsed < 1 and paused <= fetch.MAX_BACKOFF, \
+        f"Retry-After of an hour failed in {elapsed:.2f}s with the limit paused for {paused:.0f}s (at most {fetch.MAX_BACKOFF}s expected)"
+
+
+def check_error_page():
+    server = serve()
+    found = scrape.player_link("Nobody Anybody", scrape.YEAR)
+    server.shutdown()
+    return found is None, f"error page for an unknown player gave {found!r}"
+
+
+def main():
+    build_site(os.path.join(WORK, "site"), scrape.YEAR)
+    failed = 0
+    for check in [check_coalescing, check_revalidation, check_rate_limit, check_priority, check_retries, check_retry_after,
+                  check_long_wait, check_error_page]:
+        passed, seen = check()
+        failed += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {check.__name__[len('check_'):]:<14}{seen}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
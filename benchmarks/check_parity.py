@@ -0,0 +1,164 @@
+"""
+Checks that the fast paths still give the same results as the straightforward code they replaced: the batched least squares solve in
+analyze.fit_models against sklearn's LinearRegression, scrape.parse_games against the original BeautifulSoup gamelog parser on the
+fixture gamelog, and the walk-forward backtest in backtest.backtest_logs against refitting the models before every game.
+
+    python benchmarks/check_parity.py
+
+Each check prints PASS or FAIL with what was seen, and the script exits with 1 if any check failed. Needs sklearn and bs4, which the
+pipeline itself only imports on demand.
+"""
+import os
+import random
+import sys
+import tempfile
+
+import numpy as np
+
+WORK = tempfile.mkdtemp(prefix="nba-check-")
+os.environ["NBA_PLAYER_INDEX"] = os.path.join(WORK, "players.json")        # Never touch the caches of a real install
+os.environ["NBA_GAMELOG_STORE"] = os.path.join(WORK, "gamelogs.sqlite")
+os.environ["NBA_PREDICTION_CACHE"] = os.path.join(WORK, "predictions.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyze
+import backtest
+import scrape
+from gamelog import STAT_KEYS, GameLog
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIT_TOLERANCE = 1e-6        # Largest difference allowed between coefficients, relative to the size of the model
+
+
+def random_games(rng, games):
+    """
+    Return a list of game dictionaries (None for games missed) with random whole number stats, as parsed from a gamelog. The first game
+    is always played.
+    """
+    dictionaries = []
+    for game in range(games):
+        if game and rng.random() < 0.2:
+            dictionaries.append(None)
+            continue
+        stats = {key: float(rng.randint(0, 20)) for key in STAT_KEYS}
+        stats.update(mins=float(rng.randint(10, 40)), oppOff=float(rng.randint(1, 30)), oppDef=float(rng.randint(1, 30)),
+                     oppPace=float(rng.randint(1, 30)))
+        dictionaries.append(stats)
+    return dictionaries
+
+
+def check_fit():
+    rng = random.Random(1)
+    worst = 0
+    logs = 300
+    for trial in range(logs):
+        games = random_games(rng, rng.choice([2, 3, 4, 5, 10, 30]))
+        models = analyze.fit_models(games)
+        for stat, independents in analyze.MODEL_VARIABLES.items():
+            coefs, intercept = analyze.linear_regression(*analyze.make_datapoints(games, stat, *(independents + [None] * (3 - len(independents)))))
+            difference = max(np.abs(np.array(coefs) - np.array(models[stat][0])).max(), abs(intercept - models[stat][1]))
+            worst = max(worst, float(difference / (1 + np.abs(coefs).max() + abs(intercept))))
+    return worst < FIT_TOLERANCE, f"largest relative difference from sklearn over {logs} logs was {worst:.1e}"
+
+
+def reference_games(source):
+    """
+    Given the html for a player's gamelog, return a list of stats from each game (most recent first, a list of length 1 for games not
+    played), a list of links to the opposing team for each game (None if not played) and the player's team, as the original parser did
+    with BeautifulSoup before any ratings were added.
+    """
+    table = scrape.bs(source, 'lxml').find('tbody')
+    games, oppLinks, team = [], [], ""
+    for row in table.find_all('tr'):
+        data = row.find_all('td')
+        if not data:
+            continue
+        stats = []
+        for tag in data:
+            try:
+                stats.append(float(tag.text))
+            except ValueError:
+                stats.append(tag.text)
+        oppLink = data[5].a.get('href') if data[5].a is not None else None
+        team = stats[3]
+        stats = stats[7:]       # Rank, date, age, team, location, opponent and result
+        if len(stats) != 1:
+            stats.pop(0)        # Games started
+            time = stats.pop(0).split(":")
+            minutes = int(time[0]) + 1 if int(time[1]) > 30 else int(time[0])
+            stats.pop(-2)
+            for _ in range(3):
+                stats.pop(-1)
+            for _ in range(2):
+                stats.pop(9)
+            for i in range(1, 4):
+                stats.pop(i * 2)
+            stats.append(minutes)
+        else:
+            oppLink = None
+        games.append(stats)
+        oppLinks.append(oppLink)
+    games.reverse()
+    oppLinks.reverse()
+    return games, oppLinks, team
+
+
+def played_games(games):
+    """
+    Given a list of stats from each game, return it with None for every game not played, however the parser marked them.
+    """
+    return [stats if len(stats) != 1 else None for stats in games]
+
+
+def check_parse():
+    with open(os.path.join(FIXTURES, "gamelog.html"), encoding="utf-8") as f:
+        source = f.read()
+    expected = reference_games(source)
+    mismatches = []
+    for window in [None, scrape.GAMELOG_WINDOW]:
+        games, oppLinks, team = scrape.parse_games(source, window)
+        count = len(expected[0]) if window is None else window
+        if (played_games(games), oppLinks, team) != (played_games(expected[0])[:count], expected[1][:count], expected[2]):
+            mismatches.append(f"window={window}")
+    return not mismatches, f"{len(expected[0])} games parsed, " + (f"differences with {', '.join(mismatches)}" if mismatches else "no differences")
+
+
+def check_walk_forward():
+    rng = np.random.default_rng(2)
+    logs = []
+    for player in range(20):
+        data = np.abs(rng.normal(10, 4, (82, len(STAT_KEYS))))
+        data[:, 12:] = rng.integers(1, 31, (82, 3))      # Opponent ranks
+        played = rng.random(82) > 0.15
+        data[~played] = 0
+        logs.append(GameLog(data, played))
+    predicted = backtest.backtest_logs(logs)[0]
+
+    refit = []
+    for log in logs:
+        for i in range(len(log) - 1, -1, -1):       # Oldest game first, as backtest_logs predicts them
+            window = log[i + 1:i + 1 + scrape.GAMELOG_WINDOW]
+            minutes = analyze.minutes_estimation(window)[1]
+            if not log.played[i] or minutes is None:
+                continue
+            stats = analyze.prediction(minutes, analyze.fit_models(window), list(log.data[i, 12:15]))
+            refit.append([stats[stat] for stat in analyze.MODEL_VARIABLES])
+    refit = np.array(refit)
+    if predicted.shape[0] != refit.shape[0]:
+        return False, f"{predicted.shape[0]} games predicted by walking forward, {refit.shape[0]} by refitting"
+    mismatches = int((predicted[:, :len(analyze.MODEL_VARIABLES)] != refit).sum())
+    return mismatches == 0, f"{mismatches} predicted stats differ from refitting before each of {len(refit)} games"
+
+
+def main():
+    failed = 0
+    for check in [check_fit, check_parse, check_walk_forward]:
+        passed, seen = check()
+        failed += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {check.__name__[len('check_'):]:<14}{seen}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
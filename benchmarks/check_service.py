@@ -0,0 +1,153 @@
+"""
+Checks the prediction service end to end against a local stub server: the JSON answers of /predict, /health and /metrics, the 400 and
+404 answers to bad requests, the 502 answer when the site cannot be reached, and many clients asking at once.
+
+    python benchmarks/check_service.py
+
+Each check prints PASS or FAIL with what was seen, and the script exits with 1 if any check failed.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+WORK = tempfile.mkdtemp(prefix="nba-check-")
+os.environ["NBA_PLAYER_INDEX"] = os.path.join(WORK, "players.json")        # Never touch the caches of a real install
+os.environ["NBA_GAMELOG_STORE"] = os.path.join(WORK, "gamelogs.sqlite")
+os.environ["NBA_PREDICTION_CACHE"] = os.path.join(WORK, "predictions.json")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analyze
+import fetch
+import metrics
+import scrape
+import service
+from standin import build_site, synthetic_players
+from stub_server import make_server
+
+PLAYERS = synthetic_players(8, 30)
+CLIENTS = 16        # Clients asking at once, two for each of the players in check_concurrent
+service_url = None
+
+
+def serve(**options):
+    """
+    Start a stub server for the stand-in with the given options, point fetch at it and return it.
+    """
+    server = make_server(os.path.join(WORK, "site"), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fetch.SITE = f"http://127.0.0.1:{server.server_address[1]}"
+    fetch.set_rate(None)
+    return server
+
+
+def request(path):
+    """
+    Given a path on the service, return the status, content type and body of its answer.
+    """
+    try:
+        with urllib.request.urlopen(service_url + path, timeout=60) as response:
+            return response.status, response.headers.get("Content-Type"), response.read().decode("utf-8")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("Content-Type"), e.read().decode("utf-8")
+
+
+def predictions(path):
+    """
+    Given a /predict path, return the status and the list of predictions answered (None if there was no list).
+    """
+    status, contentType, body = request(path)
+    return status, json.loads(body).get("predictions") if contentType == "application/json" else None
+
+
+def check_health():
+    status, contentType, body = request("/health")
+    return status == 200 and json.loads(body) == {"status": "ok"}, f"{status} {contentType} {body}"
+
+
+def check_predict():
+    status, found = predictions("/predict?player=LeBron+James")
+    passed = status == 200 and len(found or []) == 1 and "error" not in found[0] and found[0]["plyr"] == "LeBron James" and \
+        all(stat in found[0] for stat in analyze.MODEL_VARIABLES) and bool(found[0]["message"])
+    seen = (found[0].get("error") or "no errors") if found else "no predictions"
+    return passed, f"{status} with {len(found or [])} prediction(s), {seen}"
+
+
+def check_batch():
+    status, found = predictions("/predict?player=LeBron+James&player=Bench+Player001&player=Nobody+Anybody")
+    errors = [prediction["plyr"] for prediction in found or [] if "error" in prediction]
+    passed = status == 200 and len(found or []) == 3 and errors == ["Nobody Anybody"] and \
+        all(prediction["message"] for prediction in found)
+    return passed, f"{status} with {len(found or [])} predictions, errors for {errors}"
+
+
+def check_bad_request():
+    paths = ["/predict", "/predict?player=+"] + ["/predict?player=LeBron+James&" + query for query in
+                                                 ["season=last", "date=2025-13-01", "seasons=0", "decay=2"]]
+    answers = [request(path) for path in paths]
+    passed = all(status == 400 and "error" in json.loads(body) for status, contentType, body in answers)
+    status, contentType, body = request("/nowhere")
+    passed = passed and status == 404
+    return passed, f"{[status for status, contentType, body in answers]} for bad requests, {status} for an unknown path"
+
+
+def check_site_down():
+    server = serve(limit=0, window=3600)        # Every request is asked to wait up to an hour, which fails at once
+    status, contentType, body = request("/predict?player=" + PLAYERS[-1][0].replace(" ", "+"))
+    server.shutdown()
+    serve()
+    return status == 502 and "error" in json.loads(body), f"{status} {body[:80]}"
+
+
+def check_metrics():
+    status, contentType, body = request("/metrics")
+    lines = body.splitlines()
+    passed = status == 200 and contentType.startswith("text/plain") and bool(lines) and all(line.startswith("nba_") for line in lines)
+    return passed, f"{status} with {len(lines)} counters"
+
+
+def check_concurrent():
+    names = [name for name, link, team, games in PLAYERS[:CLIENTS // 2 - 1]] + ["LeBron James"]
+    paths = ["/predict?player=" + name.replace(" ", "+") for name in names]
+    expected = [[prediction["message"] for prediction in predictions(path)[1]] for path in paths]
+    scrape.PREDICTION_CACHE.clear()        # Make every client sync and fit its player again, rather than share remembered answers
+    scrape.GAME_STORE.clear()
+    answers = [None] * CLIENTS
+
+    def ask(i):
+        status, found = predictions(paths[i % len(paths)])
+        answers[i] = status, [prediction["message"] for prediction in found or []]
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(answers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wrong = sum(answer != (200, expected[i % len(paths)]) for i, answer in enumerate(answers))
+    return wrong == 0, f"{CLIENTS} clients asking for {len(paths)} players at once, {wrong} answered differently than one at a time"
+
+
+def main():
+    global service_url
+    build_site(os.path.join(WORK, "site"), scrape.YEAR, PLAYERS)
+    serve()
+    metrics.enable()
+    server = service.make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    failed = 0
+    for check in [check_health, check_predict, check_batch, check_bad_request, check_site_down, check_metrics, check_concurrent]:
+        passed, seen = check()
+        failed += not passed
+        print(f"{'PASS' if passed else 'FAIL'}  {check.__name__[len('check_'):]:<14}{seen}")
+    server.shutdown()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
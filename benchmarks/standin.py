@@ -0,0 +1,211 @@
+"""
+Builds a local stand-in for basketball-reference from the checked-in fixtures in benchmarks/fixtures: every page the pipeline requests,
+written in fetch's replay format, for any number of players and any gamelog length. Gamelogs longer or shorter than the fixture reuse its
+rows in order with new dates, and every team gets its own ratings, so models fit on the stand-in are as well conditioned as real ones.
+Teams play each other in a round robin, and the league pages list the same ratings and games as each team's own pages.
+"""
+import datetime
+import os
+import re
+import string
+import sys
+import tempfile
+
+WORK = tempfile.mkdtemp(prefix="nba-standin-")
+for variable, name in [("NBA_PLAYER_INDEX", "players.json"), ("NBA_GAMELOG_STORE", "gamelogs.sqlite"),
+                       ("NBA_PREDICTION_CACHE", "predictions.json")]:
+    os.environ.setdefault(variable, os.path.join(WORK, name))       # Never touch the caches of a real install, unless the caller chose them
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fetch import SITE, recording_path
+from league import MONTHS
+from scrape import TEAMS
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_YEAR = 2025     # Season the fixtures were recorded in
+FIXTURE_PLAYER = ("LeBron James", "/players/j/jamesle01", "LAL")
+
+
+def read_fixture(name):
+    """
+    Return the contents of a fixture file.
+    """
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def write_page(directory, link, source):
+    """
+    Write the html for a link w/out domain to directory, where fetch's replay mode will find it.
+    """
+    with open(recording_path(SITE + link, directory), "w", encoding="utf-8") as f:
+        f.write(source)
+
+
+def season_dates(year, games):
+    """
+    Return a date for each of a number of games in a season, two days apart from late October.
+    """
+    start = datetime.date(year - 1, 10, 22)
+    return [start + datetime.timedelta(days=2 * i) for i in range(games)]
+
+
+def gamelog_page(year, games, name, team):
+    """
+    Return the html for a gamelog with the given number of games, built from the rows of the fixture gamelog.
+    """
+    source = read_fixture("gamelog.html").replace("LeBron James", name)
+    start = source.index("<tbody>") + len("<tbody>")
+    end = source.index("</tbody>")
+    rows = [row for row in re.findall(r"<tr[^>]*>.*?</tr>", source[start:end], re.S) if 'class="thead"' not in row]
+
+    body = []
+    for i, date in enumerate(season_dates(year, games)):
+        row = rows[i % len(rows)]
+        row = re.sub(r'data-stat="date_game">[^<]*<', f'data-stat="date_game">{date.isoformat()}<', row)
+        row = re.sub(r'data-stat="ranker">\d+<', f'data-stat="ranker">{i + 1}<', row)
+        row = row.replace("/teams/LAL/", f"/teams/{team}/").replace(">LAL<", f">{team}<")
+        body.append(row)
+    source = source[:start] + "\n" + "\n".join(body) + "\n" + source[end:]
+    return source.replace(f"/{FIXTURE_YEAR}.html", f"/{year}.html")
+
+
+def team_ranks(index):
+    """
+    Return the SRS, pace, offensive, defensive and net rating ranks of the team at index in TEAMS, which differ for every team.
+    """
+    return [(index * 7) % 30 + 1, (index * 11) % 30 + 1, (index * 3) % 30 + 1, (index * 13) % 30 + 1, (index * 17) % 30 + 1]
+
+
+def team_page(year, index, team):
+    """
+    Return the html for a team page, built from the fixture team page with the team's ranks from team_ranks.
+    """
+    ranks = iter(team_ranks(index))
+    source = read_fixture("team.html").replace("Boston Celtics", TEAMS[team])
+    source = re.sub(r"\((\d+)\w\w of 30\)", lambda match: f"({next(ranks)}th of 30)", source)       # SRS, Pace, Off, Def, Net
+    return source.replace(f"/{FIXTURE_YEAR}.html", f"/{year}.html")
+
+
+def round_robin(year, games=82):
+    """
+    Return a list of (date, visitor, home) for every game of a season where each team plays on every date of season_dates, against
+    opponents in a round robin.
+    """
+    teams = list(TEAMS)
+    schedule = []
+    for day, date in enumerate(season_dates(year, games)):
+        rotation = day % (len(teams) - 1)
+        order = teams[:1] + teams[1 + rotation:] + teams[1:1 + rotation]        # The first team stays put while the rest rotate
+        for i in range(len(teams) // 2):
+            pair = (order[i], order[-1 - i])
+            schedule.append((date,) + (pair if day % 2 else pair[::-1]))
+    return schedule
+
+
+def schedule_page(year, team, played):
+    """
+    Return the html for a team schedule where the given number of games have been played, against the opponents from round_robin.
+    """
+    source = read_fixture("schedule.html").replace("Los Angeles Lakers", TEAMS[team])
+    games = iter([(home if visitor == team else visitor, "@" if visitor == team else "")
+                  for date, visitor, home in round_robin(year) if team in (visitor, home)])
+    source = re.sub(r'data-stat="game_location">[^<]*</td><td data-stat="opp_name"><a href="[^"]*">[^<]*</a>',
+                    lambda match: opponent_cells(year, *next(games)), source)
+    dates = iter(season_dates(year, 82))
+    source = re.sub(r'data-stat="date_game">[^<]*<', lambda match: f'data-stat="date_game">{next(dates).strftime("%a, %b %d, %Y")}<', source)
+    results = iter(range(82))
+    source = re.sub(r'data-stat="game_result">[^<]*<', lambda match: 'data-stat="game_result">' + ("W" if next(results) < played else "") + "<",
+                    source)
+    return source.replace(f"/{FIXTURE_YEAR}.html", f"/{year}.html")
+
+
+def opponent_cells(year, opponent, location):
+    """
+    Return the location and opponent cells of a row in a team schedule.
+    """
+    return f'data-stat="game_location">{location}</td><td data-stat="opp_name"><a href="/teams/{opponent}/{year}.html">{TEAMS[opponent]}</a>'
+
+
+def league_page(year):
+    """
+    Return the html for the league's team stats page, with advanced stats that rank every team as on its own team page.
+    """
+    rows = []
+    for index, team in enumerate(TEAMS):
+        srs, pace, offense, defense, net = team_ranks(index)
+        rows.append(f'<tr><th scope="row" data-stat="ranker">{index + 1}</th><td data-stat="team"><a href="/teams/{team}/{year}.html">'
+                    f'{TEAMS[team]}</a></td><td data-stat="off_rtg">{125 - offense * 0.5:.1f}</td><td data-stat="def_rtg">'
+                    f'{105 + defense * 0.5:.1f}</td><td data-stat="pace">{105 - pace * 0.5:.1f}</td></tr>')
+    rows.append('<tr><th scope="row" data-stat="ranker"></th><td data-stat="team">League Average</td><td data-stat="off_rtg">115.0</td>'
+                '<td data-stat="def_rtg">115.0</td><td data-stat="pace">98.0</td></tr>')
+    return (f"<html><head><title>{year - 1}-{str(year)[2:]} NBA Season Summary</title></head><body>\n"
+            '<div id="all_advanced_team"><!--\n<table class="stats_table" id="advanced-team"><thead><tr><th>Rk</th><th>Team</th></tr>'
+            "</thead>\n<tbody>" + "\n".join(rows) + "</tbody></table>\n--></div>\n</body></html>")
+
+
+def month_pages(year, played):
+    """
+    Return a dictionary mapping each month of the league's schedule (as named in its link) to the html for that month, where the first
+    played dates of round_robin have been played. Months without games get an empty table, so every month has a page to replay.
+    """
+    dates = season_dates(year, 82)
+    months = {month: [] for month in MONTHS}
+    for date, visitor, home in round_robin(year):
+        score = ("100", "110") if dates.index(date) < played else ("", "")
+        months.setdefault(date.strftime("%B").lower(), []).append(
+            f'<tr><th scope="row" data-stat="date_game"><a href="/boxscores/">{date.strftime("%a, %b %d, %Y")}</a></th>'
+            f'<td data-stat="game_start_time">7:30p</td><td data-stat="visitor_team_name"><a href="/teams/{visitor}/{year}.html">'
+            f'{TEAMS[visitor]}</a></td><td data-stat="visitor_pts">{score[0]}</td><td data-stat="home_team_name">'
+            f'<a href="/teams/{home}/{year}.html">{TEAMS[home]}</a></td><td data-stat="home_pts">{score[1]}</td></tr>')
+    return {month: '<html><body><table class="stats_table" id="schedule"><thead><tr><th>Date</th></tr></thead>\n<tbody>'
+                   + "\n".join(rows) + "</tbody></table></body></html>" for month, rows in months.items()}
+
+
+def directory_page(letter, players):
+    """
+    Return the html for one letter of the player directory listing the given (name, link) pairs as active players, along with the
+    fixture's retired players.
+    """
+    source = read_fixture("directory.html").replace("Players Index for J", "Players Index for " + letter.upper())
+    start = source.index("<tbody>") + len("<tbody>")
+    end = source.index("</tbody>")
+    retired = [row for row in re.findall(r"<tr>.*?</tr>", source[start:end], re.S) if "<strong>" not in row]
+    rows = [f'<tr><th scope="row" data-stat="player"><strong><a href="{link}.html">{name}</a></strong></th></tr>' for name, link in players]
+    return source[:start] + "".join(rows + (retired if letter == "j" else [])) + source[end:]
+
+
+def synthetic_players(count, games):
+    """
+    Return (name, link, team, games) for a number of synthetic players, spread across every team.
+    """
+    teams = list(TEAMS)
+    return [(f"Bench Player{k:03d}", f"/players/b/benchpl{k:03d}", teams[k % len(teams)], games) for k in range(count)]
+
+
+def build_site(directory, year, players=(), seasons=1, played=60):
+    """
+    Write every page needed to predict the given players to directory. players is a list of (name, link, team, games) and the fixture
+    player (LeBron James, with the fixture's 60 games) is always included. Gamelogs are written for the given number of seasons ending
+    with year, and each team's schedule has the given number of games played.
+    """
+    os.makedirs(directory, exist_ok=True)
+    players = [FIXTURE_PLAYER + (60,)] + list(players)
+    for index, team in enumerate(TEAMS):
+        for season in range(year - seasons + 1, year + 1):
+            write_page(directory, f"/teams/{team}/{season}.html", team_page(season, index, team))
+        write_page(directory, f"/teams/{team}/{year}_games.html", schedule_page(year, team, played))
+    for season in range(year - seasons + 1, year + 1):
+        write_page(directory, f"/leagues/NBA_{season}.html", league_page(season))
+    for month, source in month_pages(year, played).items():
+        write_page(directory, f"/leagues/NBA_{year}_games-{month}.html", source)
+
+    for name, link, team, games in players:
+        for season in range(year - seasons + 1, year + 1):
+            write_page(directory, f"{link}/gamelog/{season}", gamelog_page(season, games, name, team))
+
+    for letter in string.ascii_lowercase:
+        listed = [(name, link) for name, link, team, games in players if link.split("/")[2] == letter]
+        write_page(directory, f"/players/{letter}/", directory_page(letter, listed))
+    return [name for name, link, team, games in players]
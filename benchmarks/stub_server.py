@@ -0,0 +1,146 @@
+"""
+Serves a stand-in site over HTTP, so the live fetch path (and the prediction service pointed at it with --site) can be exercised with no
+network access.
+
+    python benchmarks/stub_server.py [--port PORT] [--players N] [--limit N] [--fail-every N] [DIR]
+
+Pages are read from DIR, a directory of pages in fetch's replay format. Without DIR a new stand-in is built with build_site. Like the
+real site, pages are sent with an ETag and Last-Modified date and unchanged pages are answered with 304 Not Modified. --limit answers
+429 with Retry-After once more than N requests are made in a minute, and --fail-every answers every Nth request with a 503, so the
+scheduler in fetch can be checked against both. Point clients at it with NBA_FETCH_RATE=0, so they are not held to the real site's limit.
+"""
+import argparse
+import hashlib
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORK = tempfile.mkdtemp(prefix="nba-stub-")
+for variable, name in [("NBA_PLAYER_INDEX", "players.json"), ("NBA_GAMELOG_STORE", "gamelogs.sqlite"),
+                       ("NBA_PREDICTION_CACHE", "predictions.json")]:
+    os.environ.setdefault(variable, os.path.join(WORK, name))       # Never touch the caches of a real install, unless the caller chose them
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fetch import SITE, recording_path
+from standin import build_site, synthetic_players
+
+
+class Counters:
+    """
+    What a stub server has been asked for: every request path in order, and how many requests were answered with each status.
+    """
+    def __init__(self):
+        self.paths = []
+        self.statuses = {}
+        self.recent = []        # Times of recent requests, for --limit
+        self.lock = threading.Lock()
+
+    def count(self, path, window=60):
+        """
+        Count a request, and return how many have been made in the last window seconds, the seconds until the oldest of them leaves the
+        window and how many have been made in total.
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.paths.append(path)
+            self.recent = [made for made in self.recent if now - made < window] + [now]
+            return len(self.recent), window - (now - self.recent[0]), len(self.paths)
+
+    def answered(self, status):
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+def make_handler(directory, counters, limit=None, failEvery=None, delay=0, window=60):
+    """
+    Return a request handler class serving the pages in directory, and a 404 page for anything missing. Requests are counted in counters,
+    limit and failEvery work as --limit and --fail-every (with the limit counted over window seconds), and every answer is sent after
+    delay seconds.
+    """
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            recent, wait, total = counters.count(self.path, window)
+            time.sleep(delay)
+            if limit is not None and recent > limit:
+                self.send_page(429, b"<html><body><h1>Too Many Requests</h1></body></html>", {"Retry-After": str(math.ceil(wait))})
+                return
+            if failEvery and total % failEvery == 0:
+                self.send_page(503, b"<html><body><h1>Service Unavailable</h1></body></html>")
+                return
+
+            path = recording_path(SITE + self.path, directory)
+            if not os.path.exists(path):
+                self.send_page(404, b"<html><head><title>Page Not Found</title></head><body><h1>Page Not Found (404 error)</h1></body></html>")
+                return
+            with open(path, "rb") as f:
+                data = f.read()
+            validators = {"ETag": '"' + hashlib.md5(data).hexdigest() + '"', "Last-Modified": formatdate(os.path.getmtime(path), usegmt=True)}
+            if self.headers.get("If-None-Match") == validators["ETag"] or (self.headers.get("If-None-Match") is None and
+                                                                          self.headers.get("If-Modified-Since") == validators["Last-Modified"]):
+                self.send_page(304, b"", validators)
+            else:
+                self.send_page(200, data, validators)
+
+        def send_page(self, status, data, headers=None):
+            counters.answered(status)
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            for header, value in (headers or {}).items():
+                self.send_header(header, value)
+            if status != 304:
+                self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def make_server(directory, host="127.0.0.1", port=0, limit=None, failEvery=None, delay=0, window=60):
+    """
+    Return a server for the pages in directory, with what it has been asked for kept in server.counters. Port 0 picks a free port (see
+    server.server_address), and the other arguments work as in make_handler.
+    """
+    counters = Counters()
+    server = ThreadingHTTPServer((host, port), make_handler(directory, counters, limit, failEvery, delay, window))
+    server.daemon_threads = True
+    server.counters = counters
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a stand-in basketball-reference over HTTP.")
+    parser.add_argument("directory", nargs="?", help="pages to serve (default: build a new stand-in)")
+    parser.add_argument("--port", type=int, default=8001, help="port to listen on (default 8001)")
+    parser.add_argument("--players", type=int, default=0, help="synthetic players to add to a new stand-in (default 0)")
+    parser.add_argument("--limit", type=int, help="answer 429 once more than this many requests are made in a minute")
+    parser.add_argument("--fail-every", type=int, help="answer every Nth request with a 503")
+    args = parser.parse_args()
+
+    directory = args.directory
+    if directory is None:
+        from scrape import YEAR
+        directory = tempfile.mkdtemp(prefix="nba-standin-")
+        build_site(directory, YEAR, synthetic_players(args.players, 30))
+
+    server = make_server(directory, port=args.port, limit=args.limit, failEvery=args.fail_every)
+    print(f"Serving {directory} on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class TTLCache:
+    """
+    A thread-safe dictionary whose entries expire ttl seconds after being set and which evicts the least recently used
+    entries once they add up to more than maxsize. If a path is given, entries are loaded from that JSON file on creation
+    and written back to it whenever the cache changes, so a new process starts warm.
+
+    ttl -- Seconds an entry stays valid, None for no expiry
+    maxsize -- Maximum total size of the entries, None for no limit
+    path -- JSON file for persistence, None to only keep entries in memory
+    name -- Name hits and misses are counted under by the metrics module, None to not count them
+    sizeof -- Function giving the size of a value, None to count every entry as 1
+    """
+    def __init__(self, ttl=None, maxsize=None, path=None, name=None, sizeof=None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self.name = name
+        self.sizeof = sizeof
+        self.entries = OrderedDict()        # Maps key to [time stored, value], least recently used first
+        self.size = 0       # Total size of the entries
+        self.lock = threading.RLock()
+        if path:
+            self.load()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def entry_size(self, value):
+        """
+        Given a value, return how much of maxsize it takes up.
+        """
+        return self.sizeof(value) if self.sizeof else 1
+
+    def expired(self, stored):
+        """
+        Given the time an entry was stored, return True if it is older than the ttl.
+        """
+        return self.ttl is not None and time.time() - stored > self.ttl
+
+    def get(self, key, default=None, maxAge=None):
+        """
+        Return the value stored for key, or default if there is none, it has expired or it was stored more than maxAge seconds ago.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.expired(entry[0]):
+                del self.entries[key]
+                self.size -= self.entry_size(entry[1])
+                entry = None
+            if entry is not None and maxAge is not None and time.time() - entry[0] > maxAge:
+                entry = None        # Too old for this caller, but kept for others
+            if entry is not None:
+                self.entries.move_to_end(key)       # Mark as most recently used
+        if self.name:
+            metrics.add("cache", cache=self.name, result="miss" if entry is None else "hit")
+        return default if entry is None else entry[1]
+
+    def stored(self, key):
+        """
+        Return the time the value for key was stored, or None if there is none or it has expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            return None if entry is None or self.expired(entry[0]) else entry[0]
+
+    def set(self, key, value):
+        """
+        Store value for key, evicting the least recently used entries if the cache is full.
+        """
+        with self.lock:
+            old = self.entries.get(key)
+            if old is not None:
+                self.size -= self.entry_size(old[1])
+            self.entries[key] = [time.time(), value]
+            self.entries.move_to_end(key)
+            self.size += self.entry_size(value)
+            if self.maxsize is not None:
+                while self.entries and self.size > self.maxsize:
+                    self.size -= self.entry_size(self.entries.popitem(last=False)[1][1])
+            if self.path:
+                self.save()
+
+    def pop(self, key, default=None):
+        """
+        Remove key from the cache and return its value, or default if it was not stored.
+        """
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= self.entry_size(entry[1])
+                if self.path:
+                    self.save()
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            if self.path:
+                self.save()
+
+    def load(self):
+        """
+        Read unexpired entries from the cache file, if it exists.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            try:
+                stored = json.load(f)
+            except ValueError:      # Corrupt or partially written file, start empty
+                return
+        with self.lock:
+            for key, entry in stored:
+                if not self.expired(entry[0]) and key not in self.entries:
+                    self.entries[key] = entry
+                    self.size += self.entry_size(entry[1])
+
+    def save(self):
+        """
+        Write all entries to the cache file. Write to a temporary file first so a crash never leaves a partial cache.
+        """
+        with self.lock:
+            data = list(self.entries.items())
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp = self.path + ".tmp"
+            with open(temp, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp, self.path)
@@ -0,0 +1,85 @@
+"""
+Command line predictions, for scripts and one-off lookups.
+
+    python cli.py [--json] [--season YEAR] [--date YYYY-MM-DD] [--seasons N] [--decay D] [--site URL] [--replay DIR] [--metrics FILE]
+                  PLAYER [PLAYER ...]
+
+Each PLAYER is a name or a three letter team abbreviation standing for the whole roster. --seasons fits the models on past seasons as
+well, with each season's games weighted by --decay times the weight of the season after it. The prediction pipeline is only imported once the
+arguments have been read, and sklearn, bs4 and requests are only imported by the steps that need them, so --help and bad arguments
+return at once and replayed lookups never load requests. Exits with 1 if any player could not be predicted and 2 if the site could not
+be reached.
+"""
+import argparse
+import json
+import sys
+from datetime import datetime as dt
+
+
+def season_year(text):
+    """
+    Given a season as typed, return it as the year it ends in.
+    """
+    if not text.isdigit() or len(text) != 4:
+        raise argparse.ArgumentTypeError(f"season should be the year it ends in, e.g. 2025, not {text}")
+    return int(text)
+
+
+def iso_date(text):
+    """
+    Given a date as typed, return it as "YYYY-MM-DD".
+    """
+    try:
+        return dt.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"date should be written as YYYY-MM-DD, not {text}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Predict NBA players' stats for their next game.")
+    parser.add_argument("players", nargs="+", metavar="PLAYER", help="player name or three letter team abbreviation")
+    parser.add_argument("--json", action="store_true", help="print the predictions as JSON instead of text")
+    parser.add_argument("--season", type=season_year, help="year the season ends in (default: the season of --date, or the current one)")
+    parser.add_argument("--date", type=iso_date, help="predict the first game on or after this date from the games before it")
+    parser.add_argument("--seasons", type=int, default=1, help="seasons of games to fit the models on, counting this one (default 1)")
+    parser.add_argument("--decay", type=float, default=0.5, help="weight of each past season relative to the one after it (default 0.5)")
+    parser.add_argument("--site", help="base URL to scrape instead of basketball-reference, e.g. a local stand-in")
+    parser.add_argument("--replay", metavar="DIR", help="read pages recorded in DIR instead of fetching them")
+    parser.add_argument("--metrics", metavar="FILE", help="write timings and counters for the run to FILE as JSON")
+    args = parser.parse_args(argv)
+    if args.seasons < 1 or not 0 <= args.decay <= 1:
+        parser.error("--seasons should be at least 1 and --decay between 0 and 1")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    import fetch
+    import metrics
+    if args.site:
+        fetch.SITE = args.site.rstrip("/")
+    if args.replay:
+        fetch.set_mode("replay", args.replay)
+    if args.metrics:
+        metrics.enable()
+
+    from batch import predict       # Loads the pipeline, only once the arguments are known to be good
+    try:
+        predictions = predict(args.players, args.season, args.date, args.seasons, args.decay)
+    except fetch.FetchError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        if args.metrics:
+            metrics.dump(args.metrics)
+
+    if args.json:
+        print(json.dumps(predictions, indent=2))
+    else:
+        print("\n\n".join(stats["message"] for stats in predictions))
+    return 1 if any("error" in stats for stats in predictions) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+
+import metrics
+from cache import TTLCache
+
+SITE = "https://www.basketball-reference.com"
+
+# "live" requests pages over the network, "record" does the same but also saves every page to RECORD_DIR and "replay"
+# serves pages from RECORD_DIR without touching the network. Both can be set from the environment so scripts and
+# benchmarks can run offline without code changes.
+MODE = os.environ.get("NBA_FETCH_MODE", "live")
+RECORD_DIR = os.environ.get("NBA_FETCH_DIR", "recordings")
+
+TIMEOUT = 20        # Seconds to wait for a response before giving up
+POOL_SIZE = 16      # Keep-alive connections kept open to the site
+MAX_WORKERS = 8     # Most pages fetched at the same time
+
+# The site bans clients that make more than about 20 requests a minute, so live requests share a token bucket refilled at RATE tokens a
+# minute and holding at most BURST. NBA_FETCH_RATE=0 turns the limit off, e.g. for a local stand-in.
+RATE = float(os.environ.get("NBA_FETCH_RATE", 20))
+BURST = 10
+
+RETRIES = 4     # Times a request is retried after a 429, a 5xx or a connection error
+BACKOFF = 2     # Seconds before the first retry, doubled for each retry after it unless the site sends Retry-After
+MAX_BACKOFF = 5 * 60        # Longest wait before a retry. A request asked to wait longer fails at once instead.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Priorities of requests waiting for the rate limit, lowest first. Lookups a user is waiting for go ahead of batches and refreshes.
+INTERACTIVE = 0
+BATCH = 1
+priority = contextvars.ContextVar("priority", default=INTERACTIVE)
+
+# Validators and bodies of recently fetched pages, keyed by URL as [ETag, Last-Modified, html]. When a page is requested again the site is
+# asked to only send it if it changed, and an unchanged page is served from here without transferring the body. Bodies add up to at most
+# PAGES_SIZE characters of html (about as many bytes, since pages are nearly all ASCII), and a page not revalidated in 6 hours has most
+# likely changed, so it is dropped.
+PAGES_SIZE = 32 * 1024 * 1024
+PAGES = TTLCache(ttl=6 * 60 * 60, maxsize=PAGES_SIZE, name="pages", sizeof=lambda page: len(page[2]))
+
+session = None
+sessionLock = threading.Lock()
+executor = None
+executorLock = threading.Lock()
+inFlight = {}       # Maps each URL being fetched to a future for its html, so identical requests share one fetch
+inFlightLock = threading.Lock()
+
+
+class FetchError(Exception):
+    """
+    Raised when a page cannot be fetched, or cannot be found in RECORD_DIR while replaying.
+    """
+
+
+class RateLimiter:
+    """
+    A token bucket shared by every live request, holding at most burst tokens and refilled at rate tokens a minute. Each request takes
+    a token before it is sent, and requests waiting for one are served by priority, then in the order they arrived.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate / 60
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.waiting = []       # Heap of (priority, arrival number) for every request waiting for a token
+        self.arrivals = itertools.count()
+        self.condition = threading.Condition()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, level=INTERACTIVE):
+        """
+        Block until every request ahead of this one has been served and a token is free, then take it. Return the seconds waited.
+        """
+        start = time.monotonic()
+        with self.condition:
+            entry = (level, next(self.arrivals))
+            heapq.heappush(self.waiting, entry)
+            while True:
+                self.refill()
+                if self.waiting[0] == entry and self.tokens >= 1:
+                    heapq.heappop(self.waiting)
+                    self.tokens -= 1
+                    self.condition.notify_all()     # The next request in line is now at the front
+                    return time.monotonic() - start
+                # Only the request at the front waits for the bucket, the rest wait their turn
+                self.condition.wait((1 - self.tokens) / self.rate if self.waiting[0] == entry else None)
+
+    def pause(self, seconds):
+        """
+        Empty the bucket and hold back every request for the given number of seconds, e.g. when the site asks clients to back off.
+        """
+        with self.condition:
+            self.refill()
+            self.tokens = min(self.tokens, 0)
+            self.updated = max(self.updated, time.monotonic() + seconds)        # Refilling only starts again once the pause is over
+
+
+limiter = RateLimiter(RATE, BURST) if RATE > 0 else None
+
+
+def set_rate(rate, burst=BURST):
+    """
+    Change how many live requests can be made a minute and how many can be made at once after a quiet spell. A rate of 0 or None turns
+    the limit off.
+    """
+    global RATE, BURST, limiter
+    RATE, BURST = rate or 0, burst
+    limiter = RateLimiter(rate, burst) if rate else None
+
+
+@contextmanager
+def prioritized(level):
+    """
+    Context manager that gives every request made inside it, including on the fetch pool, the given priority, e.g.
+    `with prioritized(BATCH):`.
+    """
+    token = priority.set(level)
+    try:
+        yield
+    finally:
+        priority.reset(token)
+
+
+def set_mode(mode, directory=None):
+    """
+    Switch between "live", "record" and "replay" modes, optionally changing the directory recordings are kept in.
+    """
+    global MODE, RECORD_DIR
+    if mode not in ("live", "record", "replay"):
+        raise ValueError(f"Unknown fetch mode: {mode}")
+    MODE = mode
+    if directory:
+        RECORD_DIR = directory
+
+
+def get_session():
+    """
+    Return the shared requests session, creating it on first use. The session keeps connections to the site alive,
+    so only the first request pays for the TCP and TLS handshakes. requests is only imported here, so replaying pages never loads it.
+    """
+    global session
+    with sessionLock:
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(POOL_SIZE, MAX_WORKERS))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        return session
+
+
+def set_max_workers(workers):
+    """
+    Change how many pages can be fetched at the same time. Pages already being fetched are not interrupted.
+    """
+    global MAX_WORKERS, executor
+    if workers < 1:
+        raise ValueError("At least one worker is needed to fetch pages")
+    with executorLock:
+        MAX_WORKERS = workers
+        if executor is not None:
+            executor.shutdown(wait=False)
+            executor = None
+
+
+def get_executor():
+    """
+    Return the shared thread pool used to fetch pages concurrently, creating it on first use.
+    """
+    global executor
+    with executorLock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fetch")
+        return executor
+
+
+def in_context(func):
+    """
+    Return func wrapped to run in a copy of the caller's context, so a pool of its own still counts the call's metrics and keeps its
+    priority.
+    """
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(func, *args)
+
+
+def submit(func, *args):
+    """
+    Run func with args on the shared thread pool and return its future. The task runs in a copy of the caller's context, so
+    instrumentation of the call in progress also counts work done on the pool.
+    """
+    return get_executor().submit(contextvars.copy_context().run, func, *args)
+
+
+def fetch_all(func, items, progress=None):
+    """
+    Call func on every item using the shared thread pool and return a dictionary mapping each item to its result.
+    Duplicate items are only passed to func once. If progress is given, it is called with the number of items done and the total
+    after each one finishes. An exception raised by progress cancels the items that have not started.
+    """
+    unique = list(dict.fromkeys(items))
+    if len(unique) <= 1:        # Nothing to overlap, skip the pool
+        results = {}
+        for item in unique:
+            results[item] = func(item)
+            if progress:
+                progress(1, 1)
+        return results
+    futures = {submit(func, item): item for item in unique}
+    if progress is None:
+        return {futures[future]: future.result() for future in futures}
+
+    results = {}
+    try:
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            progress(len(results), len(unique))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    return results
+
+
+def full_url(link):
+    """
+    Given a link w/out domain or a full URL, return the full URL.
+    """
+    if link.startswith("http://") or link.startswith("https://"):
+        return link
+    return SITE + link
+
+
+def recording_path(url, directory=None):
+    """
+    Given a full URL, return the file the page is recorded to in directory (RECORD_DIR by default), named after the URL path so
+    recordings are easy to find.
+    """
+    path = url.split("://", 1)[-1].split("/", 1)[-1]        # Drop scheme and domain so recordings work for any site
+    name = re.sub(r"[^A-Za-z0-9.\-]+", "_", path).strip("_") or "index"
+    if not name.endswith(".html"):
+        name += ".html"
+    return os.path.join(directory or RECORD_DIR, name)
+
+
+def retry_after(response):
+    """
+    Given a response, return the seconds the site asked to wait before trying again, or None if it did not say.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def download(url):
+    """
+    Given a full URL, fetch it from the site and return the html as a string. Each attempt waits for the rate limit, and attempts that
+    fail with a 429, a 5xx or a connection error are retried with exponential backoff. If the site asks for a wait longer than
+    MAX_BACKOFF, FetchError is raised at once, so callers fail fast instead of blocking. Pages fetched before are revalidated, so an
+    unchanged page is served from PAGES without its body being sent again.
+    """
+    import requests     # Only imported once a page is fetched live, see get_session
+    stored = PAGES.get(url)
+    headers = {}
+    if stored:
+        if stored[0]:
+            headers["If-None-Match"] = stored[0]
+        if stored[1]:
+            headers["If-Modified-Since"] = stored[1]
+
+    for attempt in range(RETRIES + 1):
+        if limiter is not None:
+            waited = limiter.acquire(priority.get())
+            if waited:
+                metrics.add("rate_limit_seconds", waited, type=metrics.page_type(url))
+        start = time.perf_counter()
+        delay = None
+        try:
+            response = get_session().get(url, timeout=TIMEOUT, headers=headers)
+        except requests.RequestException as e:
+            error = FetchError(f"Could not fetch {url}: {e}")
+        else:
+            if response.status_code == 304 and stored:
+                metrics.record_request(url, 0, time.perf_counter() - start, "revalidated")
+                return stored[2]
+            if response.status_code not in RETRY_STATUSES:
+                text = response.content.decode(response.encoding or "utf-8", errors="replace")     # Decode once, skip charset sniffing
+                metrics.record_request(url, len(response.content), time.perf_counter() - start)
+                validators = [response.headers.get("ETag"), response.headers.get("Last-Modified")]
+                if response.status_code == 200 and any(validators):
+                    PAGES.set(url, validators + [text])
+                return text
+            error = FetchError(f"Could not fetch {url}: HTTP {response.status_code}")
+            delay = retry_after(response)
+            if response.status_code == 429 and limiter is not None:     # Every request is over the limit, not just this one
+                limiter.pause(min(MAX_BACKOFF, delay if delay is not None else BACKOFF * 2 ** attempt))
+            if delay is not None and delay > MAX_BACKOFF:
+                raise FetchError(f"Could not fetch {url}: HTTP {response.status_code}, asked to wait {delay:.0f}s")
+
+        if attempt == RETRIES:
+            raise error
+        metrics.add("request_retries", type=metrics.page_type(url))
+        time.sleep(min(MAX_BACKOFF, delay if delay is not None else BACKOFF * 2 ** attempt))
+
+
+def get_page(link):
+    """
+    Given a link w/out domain (or a full URL), return the html of the page as a string. Requests for a page that is already being fetched
+    wait for that fetch instead of making their own.
+    """
+    url = full_url(link)
+
+    if MODE == "replay":
+        start = time.perf_counter()
+        path = recording_path(url)
+        if not os.path.exists(path):
+            raise FetchError(f"No recording of {url} in {RECORD_DIR}")
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        metrics.record_request(url, len(text), time.perf_counter() - start, "replay")
+        return text
+
+    with inFlightLock:
+        future = inFlight.get(url)
+        first = future is None
+        if first:
+            future = inFlight[url] = Future()
+    if not first:
+        metrics.add("requests_coalesced", type=metrics.page_type(url))
+        return future.result()
+
+    try:
+        text = download(url)
+        future.set_result(text)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with inFlightLock:
+            del inFlight[url]
+
+    if MODE == "record":
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        with open(recording_path(url), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    return text
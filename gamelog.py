@@ -0,0 +1,85 @@
+import numpy as np
+
+# Every stat kept for each game, in the order scrape.parse_games lists them with the opponent ratings added
+STAT_KEYS = ["fgm", "fga", "3pm", "3pa", "ftm", "fta", "rb", "ast", "stl", "blk", "tov", "mins", "oppOff", "oppDef", "oppPace"]
+KEY_INDEX = {key: i for i, key in enumerate(STAT_KEYS)}
+
+
+class GameLog:
+    """
+    Stats from one player's games, most recent first, stored as a 2D float array with a column for each key in STAT_KEYS and a boolean
+    array marking which games the player played. Rows for games missed are all zeros. Analysis reads whole columns at once, and indexing
+    a single game gives the same dictionary (or None for a missed game) that scrape.organize_stats used to build, so code written for a
+    list of dictionaries keeps working.
+    """
+    __slots__ = ("data", "played")
+
+    def __init__(self, data, played):
+        self.data = data
+        self.played = played
+
+    @classmethod
+    def empty(cls, length):
+        """
+        Return a GameLog of the given number of games with every game marked as missed, ready to be filled in.
+        """
+        return cls(np.zeros((length, len(STAT_KEYS))), np.zeros(length, dtype=bool))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Given a list of lists of stats in the order of STAT_KEYS, with a list of length 1 for each game not played, return a GameLog.
+        """
+        log = cls.empty(len(rows))
+        for i, row in enumerate(rows):
+            if len(row) != 1:
+                log.data[i] = row
+                log.played[i] = True
+        return log
+
+    @classmethod
+    def from_dictionaries(cls, dictionaryList):
+        """
+        Given a list of dictionaries mapping each key in STAT_KEYS to a stat, with None for each game not played, return a GameLog.
+        """
+        log = cls.empty(len(dictionaryList))
+        for i, dictionary in enumerate(dictionaryList):
+            if dictionary:
+                log.data[i] = [dictionary[key] for key in STAT_KEYS]
+                log.played[i] = True
+        return log
+
+    def __len__(self):
+        return len(self.played)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return GameLog(self.data[index], self.played[index])
+        if not self.played[index]:
+            return None
+        return dict(zip(STAT_KEYS, self.data[index].tolist()))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def column(self, key):
+        """
+        Return the column of stats for key, with 0 for each game not played.
+        """
+        return self.data[:, KEY_INDEX[key]]
+
+    def weights(self):
+        """
+        Return an array that is 1 for games played and 0 for games missed.
+        """
+        return self.played.astype(float)
+
+
+def as_gamelog(stats):
+    """
+    Given a GameLog or a list of game dictionaries (None for games not played), return it as a GameLog.
+    """
+    if isinstance(stats, GameLog):
+        return stats
+    return GameLog.from_dictionaries(stats)
@@ -0,0 +1,263 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+
+import lxml.html
+
+import fetch
+import metrics
+from cache import TTLCache
+from fetch import FetchError, get_page
+
+# Months a season can have games in, in the order they are played, as named in the links to the league's monthly schedule pages
+MONTHS = ["october", "november", "december", "january", "february", "march", "april", "may", "june"]
+
+# Ratings ranks of every team from the league's team stats page, keyed by season. Each entry maps the link w/out domain to a team's page
+# (as linked from gamelogs and schedules) to its offensive, defensive and pace ranks, like scrape.parse_ratings.
+RATINGS = TTLCache(ttl=6 * 60 * 60, maxsize=8, name="league_ratings")
+
+# Every game of a season from the league's monthly schedule pages, keyed by season. Each entry maps a team's 3 letter abbrev to a list of
+# (date as "YYYY-MM-DD", opponent link w/out domain, opponent name, whether the game has been played), oldest game first.
+SCHEDULES = TTLCache(ttl=60 * 60, maxsize=8, name="league_schedule")
+
+REFRESH = 30 * 60       # Seconds between rebuilds of the current season's tables by the refresh thread, well within both TTLs
+
+# Only one thread builds each table, any others wait and use it. Each cache has its own lock, so lookups of ratings never wait for the
+# schedule's month pages to be fetched.
+buildLocks = {RATINGS.name: threading.Lock(), SCHEDULES.name: threading.Lock()}
+refresher = None
+
+
+def schedule_date(text):
+    """
+    Given a date as written in a schedule (e.g. "Tue, Oct 22, 2024"), return it as "YYYY-MM-DD", or None if it cannot be read.
+    """
+    try:
+        return dt.strptime(text.strip(), "%a, %b %d, %Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def team_abbrev(link):
+    """
+    Given a link w/out domain to a team page, e.g. /teams/BOS/2025.html, return the team's 3 letter abbrev, or None if it is not one.
+    """
+    match = re.match(r"/teams/(\w+)/", link or "")
+    return match.group(1) if match else None
+
+
+def link_season(link):
+    """
+    Given a link w/out domain to a team page, e.g. /teams/BOS/2025.html, return the season it is for, or None if it has none.
+    """
+    match = re.match(r"/teams/\w+/(\d{4})\.html", link or "")
+    return int(match.group(1)) if match else None
+
+
+def table_rows(source, tableId):
+    """
+    Given the html of a page and the id of a table on it, return the rows in the table's body, or None if there is no such table. Tables
+    the site hides in html comments are found as well.
+    """
+    start = source.find(f'id="{tableId}"')
+    if start == -1:
+        return None
+    start = source.find('<tbody', start)
+    end = source.find('</tbody>', start)
+    if start == -1 or end == -1:
+        return None
+    return lxml.html.fromstring('<table>' + source[start:end] + '</tbody></table>').xpath('.//tr')
+
+
+def cell(row, stat):
+    """
+    Given a table row, return the cell for a stat, or None if the row does not have it.
+    """
+    found = row.xpath(f'./*[@data-stat="{stat}"]')
+    return found[0] if found else None
+
+
+def ranks(values, descending):
+    """
+    Given a list of values, return the rank of each (1 for the highest if descending, else the lowest), with ties sharing a rank.
+    """
+    return [1 + sum((other > value) if descending else (other < value) for other in values) for value in values]
+
+
+def parse_ratings(source):
+    """
+    Given the html for the league's team stats page, return a dictionary mapping the link w/out domain to every team's page to its
+    offensive, defensive and pace ranks. Return None if the page has no advanced team stats.
+    """
+    rows = table_rows(source, "advanced-team")
+    if rows is None:
+        return None
+
+    teams = []
+    for row in rows:
+        team, offense, defense, pace = (cell(row, stat) for stat in ["team", "off_rtg", "def_rtg", "pace"])
+        link = team.find('.//a') if team is not None else None
+        if link is None or offense is None or defense is None or pace is None:     # Header rows and the league average
+            continue
+        try:
+            teams.append((link.get('href'), float(offense.text_content()), float(defense.text_content()), float(pace.text_content())))
+        except ValueError:
+            continue
+    if not teams:
+        return None
+
+    # The best offense and the best (lowest) defense rank 1st, as does the fastest pace, like the ranks on each team's page
+    offRanks = ranks([offense for link, offense, defense, pace in teams], True)
+    defRanks = ranks([defense for link, offense, defense, pace in teams], False)
+    paceRanks = ranks([pace for link, offense, defense, pace in teams], True)
+    return {team[0]: [offRanks[i], defRanks[i], paceRanks[i]] for i, team in enumerate(teams)}
+
+
+def parse_month(source):
+    """
+    Given the html for one month of the league's schedule, return a list of (date, visitor link, visitor name, home link, home name,
+    played) for every game on it, with links w/out domain. Return an empty list if there is no schedule table.
+    """
+    games = []
+    for row in table_rows(source, "schedule") or []:
+        date, visitor, home, points = (cell(row, stat) for stat in ["date_game", "visitor_team_name", "home_team_name", "home_pts"])
+        if date is None or visitor is None or home is None:
+            continue
+        date = schedule_date(date.text_content())
+        visitor, home = visitor.find('.//a'), home.find('.//a')
+        if date is None or visitor is None or home is None:
+            continue
+        played = points is not None and bool(points.text_content().strip())        # Scores are left blank until the game is played
+        games.append((date, visitor.get('href'), visitor.text_content(), home.get('href'), home.text_content(), played))
+    return games
+
+
+def month_games(link):
+    """
+    Given the link w/out domain to one month of the league's schedule, return its games as parse_month does, or None if the page cannot be
+    fetched. Months without games are answered with an error page, which has no games.
+    """
+    try:
+        source = get_page(link)
+    except FetchError:
+        return None
+    with metrics.stage("parse.league_schedule"):
+        return parse_month(source)
+
+
+def build_ratings(season):
+    """
+    Given a season, fetch the league's team stats page and return the ratings table for it, or None if it cannot be fetched or read.
+    """
+    try:
+        source = get_page(f"/leagues/NBA_{season}.html")
+    except FetchError:
+        return None
+    with metrics.stage("parse.league"):
+        return parse_ratings(source)
+
+
+def build_schedule(season):
+    """
+    Given a season, fetch every month of the league's schedule and return the schedule table for it, or None if no games were found or
+    any month could not be fetched, since a schedule with a month missing would give the wrong next games. Months are fetched
+    concurrently on a pool of their own, since this can be called from a task on the shared fetch pool.
+    """
+    links = [f"/leagues/NBA_{season}_games-{month}.html" for month in MONTHS]
+    with ThreadPoolExecutor(max_workers=min(len(links), fetch.MAX_WORKERS)) as monthPool:
+        months = list(monthPool.map(fetch.in_context(month_games), links))
+    if None in months:
+        return None
+
+    schedule = {}
+    for games in months:
+        for date, visitorLink, visitor, homeLink, home, played in games:
+            schedule.setdefault(team_abbrev(visitorLink), []).append((date, homeLink, home, played))
+            schedule.setdefault(team_abbrev(homeLink), []).append((date, visitorLink, visitor, played))
+    for games in schedule.values():
+        games.sort()
+    return schedule or None
+
+
+def cached_table(cache, season, build, maxAge=None):
+    """
+    Given one of the league caches, a season and the function that builds its table, return the cached table, building it if it is
+    missing, stale or was built more than maxAge seconds ago. Return None if it cannot be built.
+    """
+    table = cache.get(season, maxAge=maxAge)
+    if table is None:
+        with buildLocks[cache.name]:
+            table = cache.get(season, maxAge=maxAge)       # Another thread may have built it while this one waited
+            if table is None:
+                table = build(season)
+                if table is not None:       # Do not cache failures, so the next lookup tries again
+                    cache.set(season, table)
+    return table
+
+
+def league_ratings(season):
+    """
+    Given a season, return a dictionary mapping the link w/out domain to every team's page to its offensive, defensive and pace ranks, or
+    None if the league's team stats cannot be fetched.
+    """
+    return cached_table(RATINGS, season, build_ratings)
+
+
+def league_schedule(season, maxAge=None):
+    """
+    Given a season, return a dictionary mapping every team's 3 letter abbrev to its games, as described for SCHEDULES, or None if the
+    league's schedule cannot be fetched. If maxAge is given, a schedule built more than maxAge seconds ago is built again.
+    """
+    return cached_table(SCHEDULES, season, build_schedule, maxAge)
+
+
+def next_game(team, season, date=None, maxAge=None):
+    """
+    Given a team's 3 letter abbrev and a season, return the link w/out domain to their next opponent's page, the opponent's name and the
+    date of the team's most recent game, as scrape.parse_schedule does for the team's own schedule page. If date ("YYYY-MM-DD") is
+    given, the next game is the first one on or after it. Return None if the league's schedule is not available or has no games for the
+    team, so the caller can fall back to the team's schedule page. maxAge is passed on to league_schedule.
+    """
+    schedule = league_schedule(season, maxAge)
+    if not schedule or team not in schedule:
+        return None
+
+    lastPlayed = None
+    for gameDate, oppLink, oppTeam, played in schedule[team]:
+        if (gameDate >= date) if date is not None else not played:
+            return oppLink, oppTeam, lastPlayed
+        lastPlayed = gameDate
+    return None, None, lastPlayed
+
+
+def refresh(season):
+    """
+    Rebuild the ratings and schedule tables for a season from the site, replacing the cached tables only once the new ones are built.
+    """
+    for cache, build in [(RATINGS, build_ratings), (SCHEDULES, build_schedule)]:
+        table = build(season)
+        if table is not None:
+            cache.set(season, table)
+
+
+def start_refresh(season, interval=REFRESH):
+    """
+    Start a background thread that rebuilds the tables for a season every interval seconds, so lookups in a long-running process never
+    wait for the league pages. Does nothing if the thread is already running.
+    """
+    global refresher
+
+    def refresh_forever():
+        fetch.priority.set(fetch.BATCH)     # Lookups a user is waiting for go first
+        while True:
+            try:
+                refresh(season)
+            except Exception:       # Keep the last tables and try again next time
+                pass
+            time.sleep(interval)
+
+    if refresher is None:
+        refresher = threading.Thread(target=refresh_forever, name="league-refresh", daemon=True)
+        refresher.start()
@@ -0,0 +1,191 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentation is off unless NBA_METRICS=1 or enable() is called. While off every function here returns immediately, so the
+# pipeline pays one global lookup per instrumented step.
+ENABLED = os.environ.get("NBA_METRICS") == "1"
+
+
+class Report:
+    """
+    A thread-safe set of counters keyed by name and labels in the Prometheus style, e.g. 'requests{host="x",type="team"}'. Timings are
+    kept as two counters per stage: total seconds and number of calls.
+    """
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, value):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        """
+        Return a copy of the counters as a dictionary.
+        """
+        with self.lock:
+            return dict(self.counters)
+
+
+TOTALS = Report()       # Counters for everything the process has done
+current = contextvars.ContextVar("report", default=None)        # Report for the call in progress, if any
+
+
+def enable(on=True):
+    """
+    Turn instrumentation on or off for the whole process.
+    """
+    global ENABLED
+    ENABLED = on
+
+
+def key(name, labels):
+    """
+    Given a counter name and a dictionary of labels, return the key the counter is stored under.
+    """
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{label}="{value}"' for label, value in sorted(labels.items())) + "}"
+
+
+def add(name, value=1, **labels):
+    """
+    Add value to the named counter with the given labels, both for the whole process and for the call in progress.
+    """
+    if not ENABLED:
+        return
+    counter = key(name, labels)
+    TOTALS.add(counter, value)
+    report = current.get()
+    if report is not None:
+        report.add(counter, value)
+
+
+class Timer:
+    """
+    Context manager that adds the wall time spent inside it to a stage's counters.
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add("stage_seconds", time.perf_counter() - self.start, stage=self.name)
+        add("stage_calls", stage=self.name)
+        return False
+
+
+class NullTimer:
+    """
+    Context manager that does nothing, used for every stage while instrumentation is off.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def stage(name):
+    """
+    Return a context manager timing the named stage, e.g. `with stage("parse.team"):`.
+    """
+    if not ENABLED:
+        return NULL_TIMER
+    return Timer(name)
+
+
+@contextmanager
+def call():
+    """
+    Context manager that collects the counters of everything done inside it, including on fetch pool threads, into a new Report and
+    yields it. Yields None while instrumentation is off.
+    """
+    if not ENABLED:
+        yield None
+        return
+    report = Report()
+    token = current.set(report)
+    try:
+        yield report
+    finally:
+        current.reset(token)
+
+
+def page_type(url):
+    """
+    Given a URL, return which kind of page it is: "player", "directory", "schedule", "team", "league" or "other".
+    """
+    path = re.sub(r"^\w+://[^/]+", "", url)
+    if re.match(r"/players/\w/\w+/gamelog/", path):
+        return "player"
+    if re.match(r"/players/\w/?$", path):
+        return "directory"
+    if re.match(r"/teams/\w+/\d+_games\.html", path):
+        return "schedule"
+    if path.startswith("/teams/"):
+        return "team"
+    if path.startswith("/leagues/"):
+        return "league"
+    return "other"
+
+
+def record_request(url, size, seconds, source="network"):
+    """
+    Count a page fetched from the network or a recording, its size in bytes and how long it took, by host and kind of page.
+    """
+    if not ENABLED:
+        return
+    host = re.sub(r"^\w+://([^/]+).*$", r"\1", url)
+    kind = page_type(url)
+    add("requests", host=host, type=kind, source=source)
+    add("request_bytes", size, host=host, type=kind, source=source)
+    add("request_seconds", seconds, host=host, type=kind, source=source)
+
+
+def snapshot():
+    """
+    Return the counters for the whole process as a dictionary.
+    """
+    return TOTALS.to_dict()
+
+
+def reset():
+    """
+    Set every process-wide counter back to zero.
+    """
+    with TOTALS.lock:
+        TOTALS.counters.clear()
+
+
+def dump(path):
+    """
+    Write the counters for the whole process to a JSON file.
+    """
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True)
+
+
+def prometheus():
+    """
+    Return the counters for the whole process in the Prometheus text format, each prefixed with "nba_".
+    """
+    lines = []
+    for counter, value in sorted(snapshot().items()):
+        lines.append(f"nba_{counter} {value}")
+    return "\n".join(lines) + "\n"
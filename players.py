@@ -0,0 +1,151 @@
+import difflib
+import os
+import re
+import string
+import threading
+import time
+import unicodedata
+
+import lxml.html
+
+import metrics
+from cache import TTLCache
+from fetch import BATCH, FetchError, get_page, fetch_all, priority
+
+# Active players from each letter of the site's player directory, as [name, player link w/out domain] pairs keyed by letter. Entries never
+# expire here: a letter older than STALE_AFTER is still used while it is refetched in the background, and the directory is kept on disk so
+# a new process resolves names with no network.
+DIRECTORY = TTLCache(path=os.environ.get("NBA_PLAYER_INDEX",
+                                          os.path.join(os.path.expanduser("~"), ".cache", "nba-predictor", "players.json")))
+
+SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+FUZZY_CUTOFF = 0.85     # How similar a misspelled name must be to a player's name to match them
+STALE_AFTER = 24 * 60 * 60      # Seconds before a letter of the directory is refetched
+RETRY_AFTER = 5 * 60        # Seconds before a letter whose page could not be fetched is tried again
+
+index = {}      # Maps normalized name to a list of player links w/out domain
+indexLetters = {}       # Maps each letter to the directory entry the index was built from
+indexLock = threading.Lock()
+failures = {}       # Maps each letter whose page could not be fetched to when it was last tried
+refreshing = set()      # Letters being refetched in the background
+refreshLock = threading.Lock()
+
+
+def normalize_name(name):
+    """
+    Given a player's name, return it in lowercase ASCII without punctuation or suffixes, with words separated by single spaces, so
+    "Luka Dončić", "luka doncic" and "Gary Trent Jr." match the names in the directory however they are typed.
+    """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    name = re.sub(r"[.'`]", "", name)       # "D'Angelo" -> "dangelo", "P.J." -> "pj"
+    words = re.sub(r"[^a-z0-9]+", " ", name).split()        # Hyphens and other separators split words
+    while len(words) > 2 and words[-1] in SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def parse_directory(source):
+    """
+    Given the html for one letter of the player directory, return a list of [name, player link w/out domain] pairs for every active
+    player on it. Active players are the ones shown in bold.
+    """
+    start = source.find('<tbody')
+    if start == -1:
+        return []
+    end = source.find('</tbody>', start)
+    table = lxml.html.fromstring('<table>' + source[start:end if end != -1 else len(source)] + '</tbody></table>')
+
+    players = []
+    for row in table.xpath('.//tr'):
+        link = row.find('.//strong/a')
+        if link is not None:
+            players.append([link.text_content(), link.get('href')[:-len(".html")]])       # /players/j/jamesle01.html -> /players/j/jamesle01
+    return players
+
+
+def directory_letter(letter):
+    """
+    Given a letter, fetch its directory page, store the active players whose last name starts with it and return them. Return None if
+    the page cannot be fetched, and leave the letter alone for RETRY_AFTER seconds.
+    """
+    try:
+        source = get_page("/players/" + letter + "/")
+    except FetchError:
+        failures[letter] = time.time()
+        return None
+    with metrics.stage("parse.directory"):
+        players = parse_directory(source)
+    failures.pop(letter, None)
+    DIRECTORY.set(letter, players)
+    return players
+
+
+def refresh_letters(letters):
+    """
+    Start a background thread that refetches the given letters of the directory one at a time, so lookups keep using the stored players
+    meanwhile and never wait for the directory pages. Letters already being refetched are skipped.
+    """
+    with refreshLock:
+        letters = [letter for letter in letters if letter not in refreshing]
+        refreshing.update(letters)
+    if not letters:
+        return
+
+    def refresh():
+        priority.set(BATCH)     # Lookups a user is waiting for go first
+        for letter in letters:
+            try:
+                directory_letter(letter)
+            finally:
+                with refreshLock:
+                    refreshing.discard(letter)
+
+    threading.Thread(target=refresh, name="directory-refresh", daemon=True).start()
+
+
+def player_index():
+    """
+    Return a dictionary mapping each normalized name to the links of the active players with that name. Only letters of the directory
+    that have never been fetched are fetched before returning, stale letters are used as they are and refetched in the background, and
+    the dictionary is only rebuilt when a letter changed.
+    """
+    global index
+    now = time.time()
+    letters = {letter: DIRECTORY.get(letter) for letter in string.ascii_lowercase}
+    due = [letter for letter in letters if now - failures.get(letter, 0) > RETRY_AFTER]
+    missing = [letter for letter in due if letters[letter] is None]
+    if missing:
+        letters.update(fetch_all(directory_letter, missing))
+    stale = [letter for letter in due if letter not in missing and now - (DIRECTORY.stored(letter) or now) > STALE_AFTER]
+    if stale:
+        refresh_letters(stale)
+
+    with indexLock:
+        if any(indexLetters.get(letter) is not players for letter, players in letters.items()):
+            newIndex = {}
+            for players in letters.values():
+                for name, link in players or []:
+                    newIndex.setdefault(normalize_name(name), []).append(link)
+            index = newIndex
+            indexLetters.clear()
+            indexLetters.update(letters)
+        return index
+
+
+def find_player(player):
+    """
+    Given the name of an NBA player, return the link w/out domain to their page, or None if they are not an active player. Names are
+    matched after normalizing, then by the closest spelling if there is no exact match.
+    """
+    name = normalize_name(player or "")
+    if not name:
+        return None
+    players = player_index()
+
+    links = players.get(name)
+    if links is None:
+        close = difflib.get_close_matches(name, players.keys(), n=1, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return None
+        links = players[close[0]]
+    return links[0]
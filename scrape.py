@@ -1,15 +1,33 @@
-from bs4 import BeautifulSoup as bs
-import requests
+import json
+import lxml.html
+import os
+import time
 from datetime import datetime as dt
 
-from analyze import make_datapoints, linear_regression, minutes_estimation, prediction
+import league
+import metrics
+from cache import TTLCache
+from fetch import SITE, FetchError, get_page, submit, fetch_all       # SITE is re-exported for callers that used scrape.SITE
+from analyze import fit_models, minutes_estimation, moment_matrix, prediction
+from gamelog import GameLog
+from league import schedule_date       # Re-exported for callers that used scrape.schedule_date
+from players import find_player
+from store import GameStore
 
-SITE = "https://www.basketball-reference.com"
 
-if int(dt.now().strftime('%m')) > 8 and int(dt.now().strftime('%m')) <= 12:
-    YEAR = int(dt.now().strftime('%Y')) + 1
-else:
-    YEAR = int(dt.now().strftime('%Y'))
+
+def current_season(date=None):
+    """
+    Given a date as "YYYY-MM-DD" (today by default), return the year the NBA season played on that date ends in, e.g. 2025 for a date in
+    the 2024-25 season.
+    """
+    day = dt.strptime(date, "%Y-%m-%d") if date else dt.now()
+    if day.month > 8:
+        return day.year + 1
+    return day.year
+
+
+YEAR = current_season()     # Season used when none is given
 
 TEAMS = {
     "ATL": "Atlanta Hawks",
@@ -44,14 +62,63 @@ TEAMS = {
     "WAS": "Washington Wizards"
 }
 
+# Opponent ratings keyed by team link w/out domain, shared by every row, player and call. There are only 30 teams and
+# their ratings change at most once a day, so entries live for 6 hours. Replace with TTLCache(..., path=...) to keep
+# ratings on disk between runs.
+RATINGS_CACHE = TTLCache(ttl=6 * 60 * 60, maxsize=64, name="ratings")
+
+# Next opponent link and name and the date of the last game played, keyed by team abbrev. The next opponent changes once the
+# current one has been played, so entries only live for an hour.
+SCHEDULE_CACHE = TTLCache(ttl=60 * 60, maxsize=64, name="schedule")
+
+GAMELOG_WINDOW = 30     # Number of most recent games used for predictions
+DECAY = 0.5     # Weight of each game from last season relative to this season's, halved again for every season before that
+SEASON_END = (7, 1)     # Month and day every season is over by, after which a season's stored games are final
+
+# Parsed gamelog rows for every player looked up, so only games played since the last lookup are scraped. The database is opened on
+# first use, so importing this module creates nothing on disk. Set to None to always scrape the whole gamelog.
+GAME_STORE = GameStore(os.environ.get("NBA_GAMELOG_STORE", os.path.join(os.path.expanduser("~"), ".cache", "nba-predictor", "gamelogs.sqlite")))
+# Finished predictions (without the player's name, which is added back as it was typed), keyed by everything a prediction depends on
+# (see prediction_key), so a player whose games, next opponent and opponent ratings have not changed is predicted again without loading
+# or fitting anything. The key changes as soon as any of them does, and entries are kept on disk so a new process starts warm.
+PREDICTION_CACHE = TTLCache(ttl=24 * 60 * 60, maxsize=256, name="predictions", path=os.environ.get("NBA_PREDICTION_CACHE",
+                            os.path.join(os.path.expanduser("~"), ".cache", "nba-predictor", "predictions.json")))
+USE_LEAGUE = True       # Look up ratings and next games in the league-wide pages before fetching any team's own pages
+RECHECK = 10 * 60       # Seconds before a synced player is checked for new games again, even if their team's schedule shows a game
+
+# Positions of data columns in a gamelog row. The stat columns are FG, FGA, 3P, 3PA, FT, FTA, TRB, AST, STL, BLK and TOV, in the order
+# of gamelog.STAT_KEYS. Rows for games the player did not play stop after the column saying why.
+TEAM_COLUMN = 3
+OPP_COLUMN = 5
+MINUTES_COLUMN = 8
+STAT_COLUMNS = [9, 10, 12, 13, 15, 16, 20, 21, 22, 23, 24]
+DATE_COLUMN = 1
+DID_NOT_PLAY_COLUMNS = 8
+
+
+def bs(source, features):
+    """
+    Given html and a parser name, return the parsed BeautifulSoup tree. bs4 is imported on first use, so scripts that never parse
+    schedules or team pages don't pay for loading it.
+    """
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(source, features)
+
 
-def player_link(player):
+def player_link(player, season=None):
     """
-    Given the name of an NBA player, the function returns the html of their gamelogs on basketball reference for the current year.
-    If player is not in the NBA, function returns None.
+    Given the name of an NBA player, the function returns the html of their gamelogs on basketball reference for the given season (the
+    current year by default). If player is not in the NBA, function returns None.
     """
+    season = season or YEAR
     if not player:
         return None
+
+    link = find_player(player)      # Look the player up in the local index of active players first
+    if link:
+        return get_page(link + '/gamelog/' + str(season))
+
+    # Players not in the index (e.g. retired players) are found by guessing their page
     names = player.lower().split()      # List of lowercase first and last name
     if len(names) == 1:
         return None
@@ -59,11 +126,14 @@ def player_link(player):
 
     while True:
         # Construct proper URL for request
-        request = requests.get(SITE + "/players/" + names[1][0] + '/' + names[1][:5] + names[0][:2] + '0' + str(count) + '/gamelog/' + str(YEAR)).text
+        request = get_page("/players/" + names[1][0] + '/' + names[1][:5] + names[0][:2] + '0' + str(count) + '/gamelog/' + str(season))
         playerHTML = bs(request, 'lxml')
-        header = playerHTML.find('h1').text.lower().split()     # Split the first header into a list of lowercase strings
+        heading = playerHTML.find('h1')
+        if heading is None:     # Error pages and other pages without a heading are not player pages
+            return None
+        header = heading.text.lower().split()     # Split the first header into a list of lowercase strings
 
-        if header[1] != names[1]:       # If the page is not for an NBA player, the header will not include their last name
+        if len(header) < 2 or header[1] != names[1]:       # If the page is not for an NBA player, the header will not include their last name
             return None
         if header[0] == names[0]:       # Return page if first name matches first name of player being searched
             return request
@@ -71,44 +141,150 @@ def player_link(player):
                         # numbering them in the URL, so this is to check all those players. Once numbers run out, page will redirect to non-player page
 
 
-def team_schedule_link(team):
+def team_schedule_link(team, season=None):
     """
-    Given the three letter abbreviation for a basketball team, return html of their schedule page for the current year on basketball reference.
+    Given the three letter abbreviation for a basketball team, return html of their schedule page for the given season (the current year
+    by default) on basketball reference.
     """
-    return requests.get(SITE + "/teams/" + team + '/' + str(YEAR) + "_games.html").text
+    return get_page("/teams/" + team + '/' + str(season or YEAR) + "_games.html")
         
 
+def team_roster(team, season=None):
+    """
+    Given the three letter abbreviation for a basketball team, return a list of (name, gamelog link w/out domain) pairs for every player on
+    their roster for the given season (the current year by default). The team page also has the team's ratings, so they are added to
+    RATINGS_CACHE on the way.
+    """
+    season = season or YEAR
+    link = "/teams/" + team + '/' + str(season) + ".html"
+    source = get_page(link)
+    with metrics.stage("parse.team"):
+        ratings = parse_ratings(source)
+    if ratings is not None:
+        RATINGS_CACHE.set(link, ratings)
+
+    with metrics.stage("parse.roster"):
+        table = bs(source, 'lxml').find('table', id='roster')
+    if not table:
+        return []
+
+    roster = []
+    for row in table.find('tbody').find_all('tr'):
+        data = row.find_all('td')
+        if data and data[0].a:      # Player name and link always listed in first data column
+            playerPage = data[0].a.get('href')      # Of the form /players/j/jamesle01.html
+            roster.append((data[0].a.text, playerPage[:-len(".html")] + '/gamelog/' + str(season)))
+    return roster
+
+
 def next_opposing_team(source):
     """
     Given the html for a team schedule, return the link w/out domain for the basketball reference page of their next opponent. Return None if no valid games.
     """
+    link, team, lastPlayed = parse_schedule(source)
+    return link, team
+
+
+def parse_schedule(source, date=None):
+    """
+    Given the html for a team schedule, return the link w/out domain for the basketball reference page of their next opponent, the
+    opponent's name and the date of the team's most recent game played as "YYYY-MM-DD". Each is None if there is no such game. If date
+    ("YYYY-MM-DD") is given, the next game is the first one on or after it, played or not, so past games can be predicted.
+    """
     upcomingGames = bs(source, 'lxml')
     table = upcomingGames.find('tbody')
     rows = table.find_all('tr')
 
     link = ''
+    lastPlayed = None
     for row in rows:
         data = row.find_all('td')       # Check all data in schedule table
         if data:
-            if not data[6].text:        # This is the W/L category, which is left blank if a game has not been played
+            if date is not None:
+                gameDate = schedule_date(data[0].text)
+                upcoming = gameDate is None or gameDate >= date
+            else:
+                upcoming = not data[6].text        # This is the W/L category, which is left blank if a game has not been played
+            if upcoming:
                 link = data[5].a.get('href')        # Opposing team link
                 team = data[5].a.text
                 break
+            lastPlayed = schedule_date(data[0].text)
     
     if not link:
-        return None, None
+        return None, None, lastPlayed
 
-    return link, team
+    return link, team, lastPlayed
+
+
+def team_schedule(team, season=None, date=None, maxAge=None):
+    """
+    Given the three letter abbreviation for a basketball team, return the link w/out domain to their next opponent's website, the
+    opponent's name and the date of the team's most recent game played, as parse_schedule does, for the given season (the current year
+    by default) and date. Results are kept in SCHEDULE_CACHE so players on the same team share one schedule lookup. If maxAge is given,
+    neither SCHEDULE_CACHE nor the league's schedule is used if it was filled more than maxAge seconds ago.
+
+    Games are looked up in the league's schedule, which covers every team at once, and the team's own schedule page is only fetched if
+    the league's schedule is not available.
+    """
+    key = (team, season or YEAR, date)
+    schedule = SCHEDULE_CACHE.get(key, maxAge=maxAge)
+    if schedule is None:
+        schedule = league.next_game(team, season or YEAR, date, maxAge) if USE_LEAGUE else None
+        if schedule is None:
+            source = team_schedule_link(team, season)
+            with metrics.stage("parse.schedule"):
+                schedule = parse_schedule(source, date)
+        schedule = list(schedule)
+        SCHEDULE_CACHE.set(key, schedule)
+    return schedule
+
+
+def upcoming_opponent(team, season=None, date=None):
+    """
+    Given the three letter abbreviation for a basketball team, return the link w/out domain to their next opponent's website,
+    the opponent's name and the opponent's ratings, for the given season and date as in team_schedule. Return None for all three if there
+    is no upcoming game.
+    """
+    oppLink, oppTeam, lastPlayed = team_schedule(team, season, date)
+    if oppLink is None:
+        return None, None, None
+    return oppLink, oppTeam, get_opposing_ratings(oppLink)
 
 
 def get_opposing_ratings(link):
     """
     Given the link w/out domain to a team website, return a list of the offensive, defensive and pace ratings for that team.
+    Ratings are looked up in RATINGS_CACHE first, then in the league's ratings for the season in the link, which fill RATINGS_CACHE for
+    every team at once. The team's own page is only requested if neither has them.
     """
-    oppTeamSite = SITE + link
-    oppHTML = bs(requests.get(oppTeamSite).text, 'lxml')
+    ratings = RATINGS_CACHE.get(link)
+    if ratings is not None:
+        return ratings
+
+    table = league.league_ratings(league.link_season(link)) if USE_LEAGUE and league.link_season(link) else None
+    if table:
+        for teamLink, teamRatings in table.items():
+            RATINGS_CACHE.set(teamLink, teamRatings)
+        if link in table:
+            return table[link]
+
+    source = get_page(link)
+    with metrics.stage("parse.team"):
+        ratings = parse_ratings(source)
+    if ratings is not None:     # Do not cache failures, so the next lookup tries again
+        RATINGS_CACHE.set(link, ratings)
+    return ratings
+
+
+def parse_ratings(source):
+    """
+    Given the html for a team website, return a list of the offensive, defensive and pace ratings for that team.
+    """
+    oppHTML = bs(source, 'lxml')
     paragraphs = oppHTML.find_all('p')
 
+    ratingsText = paceText = None
     for paragraph in paragraphs:
         if paragraph.a:
             if paragraph.a.text == "SRS":
@@ -148,123 +324,260 @@ def clean_ratings(ratings):
     return cleaned
 
 
-def get_games(source):
+def get_games(source, window=GAMELOG_WINDOW, progress=None, season=None, date=None):
     """
-    Given the html for a player's gamelog, return their stats for the past season, as well as the 3 letter abbrev for their current team.
+    Given the html for a player's gamelog, return a GameLog of their stats from the most recent games of the past season (most recent game
+    first, window=None for every game), as well as the 3 letter abbrev for their current team. If date ("YYYY-MM-DD") is given, only games
+    before it are used, and the team's next game is looked up in the given season. progress, if given, is called with a message as each
+    step finishes.
     """
-    playerHTML = bs(source, 'lxml')
-    table = playerHTML.find('tbody')
-    if not table:
+    games, oppLinks, team = parse_games(source, window, date)
+    if games is None:
         return None, None
-    rows = table.find_all('tr')
+    report(progress, f"Parsed {len(games)} games")
+    if not games:
+        return attach_ratings(games, oppLinks), team
+
+    # The next opponent only depends on the player's team and is needed next, so look it up while ratings for past opponents are fetched
+    schedule = submit(team_schedule, team, season, date)
+    log = attach_ratings(games, oppLinks, progress)
+    schedule.result()
+    return log, team
+
+
+def sync_games(link, window=GAMELOG_WINDOW, progress=None, season=None, date=None):
+    """
+    Given the link w/out domain to a player's page, bring their games for the given season (the current year by default) in GAME_STORE up
+    to date, then return a GameLog of their most recent games (most recent first, window=None for every game) and the 3 letter abbrev for
+    their current team. If date ("YYYY-MM-DD") is given, only games before it are returned. Return None for both if there is no gamelog
+    table.
+
+    The gamelog is only fetched if the player's team has played since the last stored game (or RECHECK seconds have passed), and then
+    only games played since the last stored game are parsed and have their opponent ratings fetched. Seasons synced after they were over
+    are never fetched again. progress, if given, is called with a message as each step finishes.
+    """
+    season = season or YEAR
+    report(progress, "Checking for new games")
+    lastDate, team, fresh = stored_games(link, season, date)
+    if fresh and lastDate is None:      # A finished season the player has no games in
+        return None, None
+    if fresh:
+        return GAME_STORE.load_games(link, season, window, date), team
+
+    source = get_page(link + '/gamelog/' + str(season))
+    with metrics.stage("parse.player"):
+        rows = parse_rows(source, window=None, since=lastDate)
+    if rows is None:
+        GAME_STORE.add_games(link, season, [])      # Remember the season was checked, so a finished one is not fetched again
+        return None, None
+    report(progress, f"Parsed {len(rows)} new games")
+    schedule = None
+    if rows:
+        team = rows[0][1]       # Team of player in their most recent game
+        if not season_over(season):
+            schedule = submit(team_schedule, team, season, date)       # Needed next, so fetch it while ratings load
+
+    ratings = fetch_all(get_opposing_ratings, [oppLink for date, rowTeam, stats, oppLink in rows if oppLink], ratings_progress(progress))
+    GAME_STORE.add_games(link, season, [(date, rowTeam, stats + ratings[oppLink] if stats else None, oppLink)
+                                      for date, rowTeam, stats, oppLink in rows])
+    if schedule is not None:
+        schedule.result()
+    return GAME_STORE.load_games(link, season, window, date), team or ""
+
+
+def stored_games(link, season, date=None):
+    """
+    Given the link w/out domain to a player's page, a season and optionally a date ("YYYY-MM-DD"), return the date of the player's most
+    recent game in GAME_STORE, their team in that game and whether the stored games (before date, if given) are known to be up to date
+    without fetching the gamelog. The date and team are None if no games are stored, which is only up to date for a season that was
+    already over when it was checked.
+    """
+    lastDate, team, checked = GAME_STORE.last_game(link, season)
+    if lastDate is None:
+        return None, None, checked is not None and season_over(season, checked)
+    if (checked is not None and (time.time() - checked < RECHECK or season_over(season, checked))) or \
+            (date is not None and lastDate >= date):
+        return lastDate, team, True
+    lastPlayed = team_schedule(team, season, maxAge=RECHECK)[2]     # A schedule cached for longer may not show the team's latest game
+    return lastDate, team, lastPlayed is None or lastPlayed <= lastDate        # No games since the last stored one
+
+
+def season_over(season, when=None):
+    """
+    Given a season and a time in seconds since the epoch (now by default), return True if the season was over by then.
+    """
+    return (when if when is not None else time.time()) >= dt(season, *SEASON_END).timestamp()
+
+
+def past_seasons(link, season, seasons, decay=DECAY, progress=None):
+    """
+    Given the link w/out domain to a player's page, a season and a number of seasons, return the moment matrix of every game the player
+    played in the seasons - 1 seasons before it, with each game weighted by decay to the power of how many seasons ago it was. Return None
+    if there are no such games.
+
+    Seasons are streamed one at a time: each is synced to GAME_STORE (only fetched and parsed the first time), folded into the moment
+    matrix and dropped, so memory does not grow with the number of seasons.
+    """
+    history = None
+    if GAME_STORE is None:      # Past seasons are streamed through the store, so there is nowhere to put them
+        return history
+    for age in range(1, seasons):
+        report(progress, f"Adding games from {season - age}")
+        try:
+            log, team = sync_games(link, window=None, season=season - age)
+        except FetchError:      # No page for a season the player was not in the league (e.g. in replay mode)
+            continue
+        if log is None or not len(log):
+            continue
+        moments = moment_matrix(log.data, log.weights() * decay ** age)
+        history = moments if history is None else history + moments
+    return history
+
+
+def parse_games(source, window=GAMELOG_WINDOW, before=None):
+    """
+    Given the html for a player's gamelog, return a list of stats from each of the most recent games (most recent first, window=None for
+    every game), a list of links to the opposing team for each game (None if the player did not play) and the 3 letter abbrev for their
+    current team. Games on or after the date before ("YYYY-MM-DD") are skipped. Return None for all three if there is no gamelog table.
+    """
+    with metrics.stage("parse.player"):
+        rows = parse_rows(source, window, before=before)
+    if rows is None:
+        return None, None, None
+    games = [stats if stats else [None] for date, team, stats, oppLink in rows]     # Games not played are a list of length 1
+    oppLinks = [oppLink for date, team, stats, oppLink in rows]
+    team = rows[0][1] if rows else ""       # Team of player in their most recent game
+    return games, oppLinks, team
 
-    games = []
-    team = ""
-    for row in rows:
-        data = row.find_all('td')       # Get data from every column of row
-        stats = []
-        counter = 0
-        for tag in data:
-            try:
-                stat = float(tag.text)      # Turn numeric values into floats, append all to stats
-            except ValueError:
-                stat = tag.text
-            stats.append(stat)
-            if counter == 5:        # Link to opposing team always listed in 6th data column
-                oppTeamLink = tag.a.get('href')
-            counter += 1
-
-        if stats:
-            for i in range(7):      # Get rid of useless info
-                if i == 3:
-                    team = stats.pop(0)     # Get team of player
-                else:
-                    stats.pop(0)
-            if len(stats) != 1:
-                stats = clean_stats(stats)      # Make list of only needed values
-                ratings = get_opposing_ratings(oppTeamLink) 
-                stats += ratings        # Add opponent offensive, defensive and pace ratings to list
-            games.append(stats)
-
-    games.reverse()     # Reverse so that most recent games are at the start
-    return games, team
-    
 
-def clean_stats(stats):
+def parse_rows(source, window=GAMELOG_WINDOW, since=None, before=None):
     """
-    Given a list of stats for one player in one game, remove all unneeded values from list and convert minutes played to an integer.
+    Given the html for a player's gamelog, return a list of (date, team, stats, opposing team link) rows for the most recent games, most
+    recent first. Stop after window games (None for no limit) or at the first game on or before the date since ("YYYY-MM-DD"), and skip
+    games on or after the date before. Stats and the link are None for games the player did not play. Return None if there is no gamelog
+    table.
+
+    Only the first table body on the page is parsed, and when there is a window without a since date only the last rows of it, stepping
+    further back if header rows or games skipped leave the window short. Rows are read from the most recent game backwards, and only the
+    cells needed for predictions are converted.
     """
-    stats.pop(0)
+    start = source.find('<tbody')
+    if start == -1:
+        return None
+    start = source.find('>', start) + 1
+    end = source.find('</tbody>', start)
+    end = end if end != -1 else len(source)
+
+    count = window + 1 if window is not None and since is None else None     # A row more in case of a header row
+    while True:
+        first = start if count is None else last_rows(source, start, end, count)
+        table = lxml.html.fromstring('<table><tbody>' + source[first:end] + '</tbody></table>')
+        rows = read_rows(table, window, since, before)
+        if first == start or len(rows) == window:
+            return rows
+        count *= 2
+
+
+def last_rows(source, start, end, count):
+    """
+    Given the html for a player's gamelog and the bounds of its table body, return the index where the last count rows of the body
+    begin, or start if there are fewer rows than that.
+    """
+    for _ in range(count):
+        end = source.rfind('<tr', start, end)
+        if end == -1:
+            return start
+    return end
+
 
-    # Convert time to int
-    time = stats.pop(0).split(":")
+def read_rows(table, window, since, before):
+    """
+    Given a parsed gamelog table, return its rows as parse_rows does.
+    """
+    rows = []
+    for row in reversed(table.xpath('.//tr')):
+        if window is not None and len(rows) == window:
+            break
+        data = row.findall('td')       # Get data from every column of row, header rows have none
+        if not data:
+            continue
+
+        date = data[DATE_COLUMN].text_content()
+        if before is not None and date >= before:
+            continue
+        if since is not None and date <= since:     # Every older game has been read before
+            break
+        team = data[TEAM_COLUMN].text_content()
+        if len(data) == DID_NOT_PLAY_COLUMNS:     # If player was inactive or did not play
+            rows.append((date, team, None, None))
+        else:
+            stats = [float(data[i].text_content()) for i in STAT_COLUMNS]
+            stats.append(minutes_played(data[MINUTES_COLUMN].text_content()))
+            rows.append((date, team, stats, data[OPP_COLUMN].find('a').get('href')))     # Link to opposing team
+
+    return rows
+
+
+def minutes_played(time):
+    """
+    Given the time a player played in a game as a "minutes:seconds" string, return the minutes played rounded to an integer.
+    """
+    time = time.split(":")
     if int(time[1]) > 30:
-        approxMins = int(time[0]) + 1
-    else:
-        approxMins = int(time[0])
+        return int(time[0]) + 1
+    return int(time[0])
+
+
+def attach_ratings(games, oppLinks, progress=None):
+    """
+    Given a list of stats from each game (most recent first) and the link to the opposing team for each game, return a GameLog of the
+    games where every game played has the opponent offensive, defensive and pace ratings added. Ratings for different opponents are
+    fetched concurrently, and progress, if given, is called with a message as each one arrives.
+    """
+    ratings = fetch_all(get_opposing_ratings, [link for link in oppLinks if link], ratings_progress(progress))
+    log = GameLog.empty(len(games))
+    for i, (stats, link) in enumerate(zip(games, oppLinks)):
+        if link:
+            log.data[i] = stats + ratings[link]      # Add opponent offensive, defensive and pace ratings to stats
+            log.played[i] = True
+    return log
     
-    # Remove unneeded values
-    stats.pop(-2)
-    for _ in range(3):
-        stats.pop(-1)
-    for _ in range(2):
-        stats.pop(9)
-    for i in range(1, 4):
-        stats.pop(i * 2)
-    stats.append(approxMins)
 
-    return stats
+def ratings_progress(progress):
+    """
+    Given a progress callback (or None), return a callback for fetch_all that reports how many opponents have had their ratings fetched.
+    """
+    if progress is None:
+        return None
+    return lambda done, total: progress(f"Fetched ratings for {done} of {total} opponents")
+
+
+def report(progress, message):
+    """
+    Pass message to the progress callback, if there is one.
+    """
+    if progress:
+        progress(message)
 
 
 def organize_stats(stats):
     """
-    Given a list of lists, where each list is stats from a separate game for one player, return a list of dictionaries mapping each stat
-    to its key for easier accessibility. Only use the most recent 30 games.
+    Given a GameLog, or a list of lists where each list is stats from a separate game for one player, most recent first, return a GameLog
+    of only the most recent GAMELOG_WINDOW games. Each game in the GameLog can be read as a dictionary mapping each stat to its key.
     """
-    gameDics = []
-    for i in range(len(stats)) if len(stats) < 31 else range(30):       # Most recent games
-        if len(stats[i]) == 1:
-            gameDics.append(None)       # If player was inactive or did not play
-        else:
-            gameDic = {}
-            keys = ["fgm", "fga", "3pm", "3pa", "ftm", "fta", "rb", "ast", "stl", "blk", "tov", "mins", "oppOff", "oppDef", "oppPace"]
-            for j in range(len(keys)):
-                gameDic[keys[j]] = stats[i][j]      # Map stats to keys
-            gameDics.append(gameDic)
-
-    return gameDics
-
-
-def make_regression_dictionary(orgStats):
-    """
-    Given a list of dictionaries where each dictionary has stats for one player from one game, define the variables that
-    will be used to create models for each stat, then create models for each stat, and return dictionary of models where
-    each stat is the key for its own model.
-    """
-    # Define what variables will be used to create a model for dependent variables (keys)
-    comparisons = {
-        "rb": ["mins", "oppPace"],
-        "ast": ["mins", "oppPace", "oppDef"],
-        "stl": ["mins", "oppPace", "oppOff"],
-        "blk": ["mins", "oppPace", "oppOff"],
-        "tov": ["mins", "oppPace", "oppDef"],
-        "fta": ["mins", "oppPace", "oppDef"],
-        "3pa": ["mins", "oppPace", "oppDef"],
-        "fga": ["mins", "oppPace", "oppDef"],
-        "fgm": ["fga", "oppPace", "oppDef"],
-        "3pm": ["3pa", "oppPace", "oppDef"],
-        "ftm": ["fta", "oppPace"]
-    }
-    regressions = {}
-
-    for comparison in comparisons:
-        # Create models by getting datapoints for each variable, then using multiple linear regression
-        if len(comparisons[comparison]) == 3:
-            regressions[comparison] = linear_regression(*make_datapoints(orgStats, comparison, *comparisons[comparison]))
-        else:
-            regressions[comparison] = linear_regression(*make_datapoints(orgStats, comparison, *comparisons[comparison], None))
-        
-    return regressions
+    if not isinstance(stats, GameLog):
+        stats = GameLog.from_rows(stats)       # Games the player was inactive for or did not play are marked as missed
+    return stats[:GAMELOG_WINDOW]       # Most recent games
+
+
+def make_regression_dictionary(orgStats, history=None):
+    """
+    Given a list of dictionaries where each dictionary has stats for one player from one game, create models for each stat from the
+    variables in analyze.MODEL_VARIABLES, and return dictionary of models where each stat is the key for its own model. history, if
+    given, is the moment matrix of earlier games from past_seasons, which the models are fit on as well.
+    """
+    with metrics.stage("fit"):
+        return fit_models(orgStats, history)     # Every model is fit at once with a single batched least squares solve
 
 
 def format_stats(warnings, stats):
@@ -293,48 +606,149 @@ def format_stats(warnings, stats):
     return message
 
 
-def make_message(player):
+def make_prediction(player, progress=None, season=None, date=None, seasons=1, decay=DECAY):
     """
-    Given the name of an NBA player, return a string predicting the player's stats for their next game. Return some error message if something goes wrong.
+    Given the name of an NBA player, return a dictionary of predicted stats for their next game, along with the player, their team, the
+    opposing team and warnings about missed games. If something goes wrong, return a dictionary with the player and an error message.
+    progress, if given, is called with a message describing each step as it finishes. An exception raised by progress stops the
+    prediction and is passed on to the caller. While the metrics module is enabled, the timings and counts for this call are added
+    under "metrics".
+
+    season -- Year the season ends in, the season of date (or the current one) by default
+    date -- "YYYY-MM-DD" to predict the player's first game on or after that date from the games before it, the next game by default
+    seasons -- Seasons of games the models are fit on, counting this one. Minutes are always estimated from this season.
+    decay -- Weight of last season's games relative to this season's, multiplied again for every season before that
+    """
+    with metrics.call() as callReport:
+        with metrics.stage("make_prediction"):
+            stats, message = remembered_prediction(player, progress, season, date, seasons, decay)
+    if callReport is not None:
+        stats["metrics"] = callReport.to_dict()
+    return stats
+
+
+def remembered_prediction(player, progress=None, season=None, date=None, seasons=1, decay=DECAY):
+    """
+    Given the arguments of make_prediction, return a dictionary like predict_player and the message format_stats makes from it (None if
+    the dictionary is an error). Predictions for players in the index are kept in PREDICTION_CACHE and returned from it for as long as
+    prediction_key finds nothing they depend on has changed. Only the predicted stats are kept, so the name and message always use the
+    player as given.
+    """
+    season = season or (current_season(date) if date else YEAR)
+    link = find_player(player) if GAME_STORE is not None else None
+    key = prediction_key(link, season, date, seasons, decay) if link else None
+    remembered = PREDICTION_CACHE.get(key) if key else None
+    if remembered is not None:
+        report(progress, f"No changes for {player} since the last prediction")
+        stats = dict(remembered, plyr=player)
+        return stats, format_stats(stats["warnings"], stats)
+
+    stats = predict_player(player, progress, season, date, seasons, decay)
+    if "error" in stats:
+        return stats, None
+    key = prediction_key(link, season, date, seasons, decay) if link else None      # Games were synced, so the key is known now
+    if key:
+        PREDICTION_CACHE.set(key, {stat: value for stat, value in stats.items() if stat != "plyr"})
+    return stats, format_stats(stats["warnings"], stats)
+
+
+def prediction_key(link, season, date, seasons, decay):
+    """
+    Given the link w/out domain to a player's page and the season, date, seasons and decay of a prediction, return the key its result is
+    kept under in PREDICTION_CACHE: the arguments with the date of the player's most recent stored game, their next opponent's link and
+    the opponent's ratings. Return None if the stored games may be out of date, which only fetching the gamelog can tell.
+
+    Only the store, SCHEDULE_CACHE and RATINGS_CACHE are read, so a key costs no fetch unless those caches have expired or the player was
+    last checked more than RECHECK seconds ago with a schedule older than that.
+    """
+    lastDate, team, fresh = stored_games(link, season, date)
+    if not fresh or lastDate is None:
+        return None
+    oppLink, oppTeam, oppRatings = upcoming_opponent(team, season, date)
+    return json.dumps([link, season, date, seasons, decay, lastDate, oppLink, oppRatings])
+
+
+def predict_player(player, progress=None, season=None, date=None, seasons=1, decay=DECAY):
     """
-    playerLink = player_link(player)        # Get link to player page on basketball reference
+    Given the name of an NBA player, return a dictionary like make_prediction, without the metrics.
+    """
+    season = season or (current_season(date) if date else YEAR)
+    report(progress, f"Resolving {player}")
+    with metrics.stage("resolve"):
+        link = find_player(player) if GAME_STORE is not None else None     # Get link to player page on basketball reference
+        playerLink = None if link else player_link(player, season)
 
     # If player named is not/never was in NBA
-    if playerLink is None:
-        return "Please enter the name of a valid NBA player"
-    
-    stats, playerTeam = get_games(playerLink)       # Get player stats, team
+    if not link and playerLink is None:
+        return {"plyr": player, "error": "Please enter the name of a valid NBA player"}
+
+    with metrics.stage("games"):
+        if link:
+            stats, playerTeam = sync_games(link, progress=progress, season=season, date=date)     # Only scrapes games played since the last lookup
+        else:
+            stats, playerTeam = get_games(playerLink, progress=progress, season=season, date=date)       # Get player stats, team
 
     # If player is retired
     if stats is None:
-        return "Please enter the name of a current NBA player"
+        return {"plyr": player, "error": "Please enter the name of a current NBA player"}
 
     # If no stats can be found for some reason (maybe very beginning of season)
-    if not stats:
-        return f"Could not find any stats from previous games this year for {player}"
+    if not len(stats):
+        return {"plyr": player, "error": f"Could not find any stats from previous games this year for {player}"}
 
-    oppLink, oppTeam = next_opposing_team(team_schedule_link(playerTeam))       # Get opposing team site link and name
+    report(progress, "Fetching next opponent")
+    with metrics.stage("opponent"):
+        oppLink, oppTeam, oppRatings = upcoming_opponent(playerTeam, season, date)       # Get opposing team site link, name and ratings
 
+    models = None
+    if link and seasons > 1 and oppRatings is not None:     # Only for players in the index, whose page is known, with a game to predict
+        with metrics.stage("history"):
+            history = past_seasons(link, season, seasons, decay, progress)
+        models = make_regression_dictionary(organize_stats(stats), history)
+
+    report(progress, "Fitting models")
+    with metrics.stage("predict"):
+        return build_prediction(player, playerTeam, stats, oppLink, oppTeam, oppRatings, models)
+
+
+def build_prediction(player, playerTeam, stats, oppLink, oppTeam, oppRatings, models=None):
+    """
+    Given a player's name, their team, their stats with opponent ratings (most recent game first) and the link, name and ratings of their
+    next opponent, return a dictionary like make_prediction. Nothing is fetched. Models already fit for the player (e.g. by a batch) can
+    be passed in, otherwise they are fit here.
+    """
     # No upcoming games (maybe end/beginning of season)
     if oppLink is None:
-        return f"Cannot find an upcoming game for {player}"
-
-    oppRatings = get_opposing_ratings(oppLink)      # Get ratings for opposing team
+        return {"plyr": player, "error": f"Cannot find an upcoming game for {player}"}
 
     # If ratings can't be scraped from opposing team website (maybe due to website format change)
     if oppRatings is None:
-        return f"Could not get ratings for {oppTeam}"
+        return {"plyr": player, "error": f"Could not get ratings for {oppTeam}"}
     
-    orgStats = organize_stats(stats)        # Organize stats into dictionaries
+    orgStats = organize_stats(stats)        # Keep the most recent games
     missedBools, minutes = minutes_estimation(orgStats)     # Estimate minutes player will play
 
     # If player has not played any games that are counted
     if minutes is None:
-        return f"{player} has missed his last 30 games (or however many have been played so far). Hence, stats cannot be predicted."
+        return {"plyr": player, "error": f"{player} has missed his last 30 games (or however many have been played so far). Hence, stats cannot be predicted."}
     
-    models = make_regression_dictionary(orgStats)       # Make statistical models to predict each stat
+    if models is None:
+        models = make_regression_dictionary(orgStats)       # Make statistical models to predict each stat
     stats = prediction(minutes, models, oppRatings)     # Predict stats
     stats["plyr"] = player
     stats["team"] = TEAMS[playerTeam]
     stats["oppTeam"] = oppTeam
-    return format_stats(missedBools, stats)     # Return formatted string with predictions
\ No newline at end of file
+    stats["warnings"] = missedBools
+    return stats
+
+
+def make_message(player, progress=None, season=None, date=None, seasons=1, decay=DECAY):
+    """
+    Given the name of an NBA player, return a string predicting the player's stats for their next game. Return some error message if something goes wrong.
+    progress, season, date, seasons and decay work as in make_prediction.
+    """
+    with metrics.stage("make_prediction"):
+        stats, message = remembered_prediction(player, progress, season, date, seasons, decay)
+    if "error" in stats:
+        return stats["error"]
+    return message     # Formatted string with predictions
@@ -0,0 +1,140 @@
+"""
+Headless prediction service. Serves the same predictions as the GUI as JSON over HTTP, keeping ratings, schedules, the player index and
+player gamelogs warm between requests. The league's ratings and schedule for the current season are rebuilt in the background every
+league.REFRESH seconds.
+
+    python service.py [--host HOST] [--port PORT] [--site URL] [--replay DIR] [--metrics]
+
+GET /predict?player=LeBron+James[&player=BOS...]  Predictions for each player (team abbreviations stand for the whole roster), for the
+                                                  next game or the first one on or after &date=YYYY-MM-DD, in &season=YYYY,
+                                                  fit on &seasons=N seasons with each past one weighted by &decay=D
+GET /health                                       {"status": "ok"}
+GET /metrics                                      Process-wide counters in the Prometheus text format (with --metrics)
+"""
+import argparse
+import json
+from datetime import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import fetch
+import league
+import metrics
+from batch import predict
+from scrape import YEAR, DECAY
+
+
+def parse_when(season, date):
+    """
+    Given a season and a date as strings (either can be None), return the season as an integer and the date as "YYYY-MM-DD". Raise
+    ValueError if either cannot be read.
+    """
+    if season is not None:
+        if not season.isdigit():
+            raise ValueError(f"Season should be the year it ends in, e.g. 2025, not {season}")
+        season = int(season)
+    if date is not None:
+        try:
+            date = dt.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f"Date should be written as YYYY-MM-DD, not {date}")
+    return season, date
+
+
+def parse_history(seasons, decay):
+    """
+    Given the number of seasons and the decay as strings, return them as an integer and a float. Raise ValueError if either cannot be read.
+    """
+    if not seasons.isdigit() or int(seasons) < 1:
+        raise ValueError(f"Seasons should be a whole number of at least 1, not {seasons}")
+    try:
+        weight = float(decay)
+    except ValueError:
+        weight = None
+    if weight is None or not 0 <= weight <= 1:
+        raise ValueError(f"Decay should be a number between 0 and 1, not {decay}")
+    return int(seasons), weight
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    Handles one request to the service. Each request runs on its own thread, and all of them share the caches of the process.
+    """
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif url.path == "/metrics":
+            self.send_text(200, metrics.prometheus())
+        elif url.path == "/predict":
+            query = parse_qs(url.query)
+            players = [player for player in query.get("player", []) if player.strip()]
+            if not players:
+                self.send_json(400, {"error": "Give at least one player, e.g. /predict?player=LeBron+James"})
+                return
+            try:
+                season, date = parse_when(query.get("season", [None])[0], query.get("date", [None])[0])
+                seasons, decay = parse_history(query.get("seasons", ["1"])[0], query.get("decay", [str(DECAY)])[0])
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            try:
+                self.send_json(200, {"predictions": predict(players, season, date, seasons, decay)})
+            except fetch.FetchError as e:       # The site could not be reached, not a problem with the request
+                self.send_json(502, {"error": str(e)})
+        else:
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+
+    def send_json(self, status, body):
+        self.send_text(status, json.dumps(body), "application/json")
+
+    def send_text(self, status, text, contentType="text/plain; version=0.0.4"):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):       # Keep the console quiet, metrics cover what requests were made
+        pass
+
+
+def make_server(host="127.0.0.1", port=8000):
+    """
+    Return a server for the service, ready to serve_forever. Port 0 picks a free port (see server.server_address).
+    """
+    server = ThreadingHTTPServer((host, port), PredictionHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve NBA player stat predictions as JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default 8000)")
+    parser.add_argument("--site", help="base URL to scrape instead of basketball-reference, e.g. a local stand-in")
+    parser.add_argument("--replay", metavar="DIR", help="serve pages recorded in DIR instead of fetching them")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics and serve them at /metrics")
+    args = parser.parse_args()
+
+    if args.site:
+        fetch.SITE = args.site.rstrip("/")
+    if args.replay:
+        fetch.set_mode("replay", args.replay)
+    if args.metrics:
+        metrics.enable()
+    league.start_refresh(YEAR)      # Keep the league's ratings and schedule fresh, so no request waits on them
+
+    server = make_server(args.host, args.port)
+    print(f"Serving predictions on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from gamelog import GameLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    player TEXT NOT NULL,
+    season INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    team TEXT NOT NULL,
+    oppLink TEXT,
+    stats TEXT,
+    PRIMARY KEY (player, season, date)
+);
+CREATE TABLE IF NOT EXISTS synced (
+    player TEXT NOT NULL,
+    season INTEGER NOT NULL,
+    checked REAL NOT NULL,
+    PRIMARY KEY (player, season)
+);
+"""
+
+
+class GameStore:
+    """
+    An SQLite database of parsed gamelog rows for each player and season, each stored with the opponent ratings it was parsed with, so a
+    player's games only have to be scraped once. Rows are (date, team, stats, opponent link), where stats is a list in the order of
+    gamelog.STAT_KEYS and both stats and the link are None for games the player did not play. The database is only opened (and its
+    directory created) when it is first used.
+
+    path -- Database file, ":memory:" to keep games only for this process
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """
+        Return the connection to the database, opening it and creating its tables on first use. Must be called with the lock held.
+        """
+        if self.connection is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            with connection:
+                connection.executescript(SCHEMA)
+            self.connection = connection
+        return self.connection
+
+    def last_game(self, player, season):
+        """
+        Given a player link w/out domain and a season, return the date of the most recent stored game, the player's team in that game and
+        the time the player was last synced. The date and team are None if no games are stored, and the time is None if the player has
+        never been synced for the season.
+        """
+        with self.lock:
+            game = self.connect().execute("SELECT date, team FROM games WHERE player = ? AND season = ? ORDER BY date DESC LIMIT 1",
+                                           (player, season)).fetchone()
+            synced = self.connection.execute("SELECT checked FROM synced WHERE player = ? AND season = ?", (player, season)).fetchone()
+        if game is None:
+            return None, None, synced[0] if synced else None
+        return game[0], game[1], synced[0] if synced else None
+
+    def add_games(self, player, season, rows):
+        """
+        Given a player link w/out domain, a season and a list of rows, store the rows (replacing any stored for the same dates) and mark
+        the player as synced now.
+        """
+        with self.lock, self.connect():
+            self.connection.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?)",
+                                        [(player, season, date, team, oppLink, json.dumps(stats) if stats else None)
+                                         for date, team, stats, oppLink in rows])
+            self.connection.execute("INSERT OR REPLACE INTO synced VALUES (?, ?, ?)", (player, season, time.time()))
+
+    def load_games(self, player, season, window=None, before=None):
+        """
+        Given a player link w/out domain and a season, return a GameLog of the most recent stored games (window=None for every game),
+        most recent first. If before ("YYYY-MM-DD") is given, only games before that date are returned.
+        """
+        query = "SELECT stats FROM games WHERE player = ? AND season = ?"
+        parameters = (player, season)
+        if before is not None:
+            query += " AND date < ?"
+            parameters += (before,)
+        query += " ORDER BY date DESC"
+        if window is not None:
+            query += " LIMIT ?"
+            parameters += (window,)
+        with self.lock:
+            rows = self.connect().execute(query, parameters).fetchall()
+
+        log = GameLog.empty(len(rows))
+        for i, (stats,) in enumerate(rows):
+            if stats:
+                log.data[i] = json.loads(stats)
+                log.played[i] = True
+        return log
+
+    def clear(self, player=None):
+        """
+        Remove every stored game, or only the games of one player.
+        """
+        with self.lock, self.connect():
+            if player is None:
+                self.connection.execute("DELETE FROM games")
+                self.connection.execute("DELETE FROM synced")
+            else:
+                self.connection.execute("DELETE FROM games WHERE player = ?", (player,))
+                self.connection.execute("DELETE FROM synced WHERE player = ?", (player,))